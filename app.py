@@ -1,44 +1,277 @@
+import io
 import os
+import re
+import copy
+import functools
 import json
-from flask import Flask, request, jsonify
-from google.api_core.client_options import ClientOptions
+import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from flask import Flask, Request, Response, g, request, jsonify, send_file
 from google.cloud import documentai  # type: ignore
 import openai
 from openai import OpenAI
-from PyPDF2 import PdfReader
+from google.api_core import exceptions as google_exceptions
+from PyPDF2 import PdfReader, PdfWriter
+from cache import create_cache
+from documentai_client import get_documentai_client
+from jobs import JobStore, JobWorkerPool
+from ratelimit import OutboundScheduler
+from vendor_templates import VendorTemplateStore
+from postprocess import postprocess_invoice
+from merge import merge_responses
+from export import EXPORT_FORMATS, export_invoices, read_records
+from metrics import CONTENT_TYPE, REGISTRY, CallbackCounter, Counter, Histogram
+from invoice_schema import (
+    INVOICE_SCHEMA, PAGE_TAGGED_INVOICE_SCHEMA, parse_invoice, parse_reasked_fields, reask_prompt, response_format,
+    subset_schema,
+)
+
+# A feltöltések ennél a méretnél kisebbek memóriában maradnak, a nagyobbak
+# egyedi, névtelen átmeneti fájlba kerülnek (nincs ütközés azonos fájlnévnél)
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+class SpooledRequest(Request):
+    """Request, amely a feltöltött fájlokat SpooledTemporaryFile-ba fogadja."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, mode="rb+")
 
 # Flask alkalmazás létrehozása
 app = Flask(__name__)
+app.request_class = SpooledRequest
+
+# A teljes OCR szöveg és a modell válaszainak naplózása csak hibakereséshez (nagy és lassú)
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0") == "1"
+
+# Metrikák (a /metrics végponton, Prometheus formátumban)
+STAGE_SECONDS = Histogram(
+    "invoice_stage_seconds", "Duration of pipeline stages (save, hash, text_layer, ocr, llm, parse, merge).", ["stage"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Time until the response starts, per endpoint.", ["endpoint", "status"]
+)
+LLM_REQUESTS = Counter("openai_requests_total", "OpenAI chat completion requests.", ["outcome"])
+LLM_TOKENS = Counter("openai_tokens_total", "OpenAI tokens used.", ["type"])
+LLM_COST = Counter("openai_cost_usd_total", "Estimated OpenAI cost in USD.")
+PAGES_EXTRACTED = Counter("invoice_pages_total", "Pages by text source.", ["source"])
 
 # OpenAI API kulcs beállítása környezeti változóból
 api_key = os.getenv("ASSISTANT_KEY")
 openai.api_key = api_key  # Beállítjuk az OpenAI API kulcsot
-client = OpenAI(api_key=api_key)
-
-# GCP hitelesítési fájl létrehozása a környezeti változóból
-def create_gcp_credentials_file():
-    credentials_json = os.getenv("GCP_CREDENTIALS")
-    if credentials_json:
-        credentials_path = "/tmp/credentials.json"  # Átmeneti fájl
-        with open(credentials_path, "w") as f:
-            f.write(credentials_json)
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-    else:
-        raise Exception("No GCP credentials found in environment variable.")
+# Az újrapróbálást az openai_scheduler végzi, a kliens saját újrapróbálása ki van kapcsolva
+client = OpenAI(api_key=api_key, max_retries=0)
+
+# Google Document AI paraméterek
+PROJECT_ID = "gifted-country-324010"
+LOCATION = "us"
+PROCESSOR_ID = "e0bb021f188ca0d8"
+MIME_TYPE = "application/pdf"
+
+# Az OpenAI modell és a kinyerési utasítás
+OPENAI_MODEL = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are an AI that extracts invoice data."
+INVOICE_PROMPT = (
+    "Here is part of the text of an invoice. Please extract the following information as structured data:\n"
+    "1. Invoice Date (if not present, return '-')\n"
+    "2. PO Number (if not present, return '-')\n"
+    "3. Seller Company Name (if not present, return '-')\n"
+    "4. Seller Company Address (if not present, return '-')\n"
+    "5. Seller Tax No. (if not present, return '-')\n"
+    "6. Buyer Company Name (if not present, return '-')\n"
+    "7. Buyer Company Address (if not present, return '-')\n"
+    "8. Buyer Tax No. (if not present, return '-')\n"
+    "9. Items with structured information (if items are not present, return '-'): \n"
+    "   - description as 'description'\n"
+    "   - quantity (without unit) as 'quantity'\n"
+    "   - unit as 'unit'\n"
+    "   - price per unit as 'price'\n"
+    "   - full amount as 'amount'\n"
+    "10. VAT percent (if there is no VAT information, return '-')\n"
+    "11. Subtotal excluded VAT (if not present, return '-')\n"
+    "12. Total included VAT (if not present, return '-')\n"
+    "13. Shipping Cost (if not present, return '-')\n\n"
+)
+# Csomagolt módban (több oldal egy kérésben) a fenti utasítás kiegészítése
+PACKED_PROMPT = (
+    "The text below contains several consecutive pages of the same invoice. "
+    "Each page starts with a line '=== Page N ==='.\n"
+    "Return one JSON object with the fields above for the whole text, and add a 'page' field "
+    "with the page number N to every element of 'Items'.\n\n"
+)
+
+# Kinyerési mód: per_page (oldalanként egy kérés) vagy packed (oldalak tokenkeretbe csomagolva)
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "per_page")
+EXTRACTION_MODES = ("per_page", "packed")
+LLM_PACK_TOKEN_BUDGET = int(os.getenv("LLM_PACK_TOKEN_BUDGET", "8000"))
+LLM_PACK_MAX_PAGES = int(os.getenv("LLM_PACK_MAX_PAGES", "10"))
+
+# Költségszámítás (USD / 1M token), a gpt-4o-mini listaára az alapértelmezés
+OPENAI_INPUT_COST_PER_1M = float(os.getenv("OPENAI_INPUT_COST_PER_1M", "0.15"))
+OPENAI_OUTPUT_COST_PER_1M = float(os.getenv("OPENAI_OUTPUT_COST_PER_1M", "0.60"))
+
+# Strukturált kimenet: a modell a kanonikus JSON sémának megfelelő választ ad
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") == "1"
+
+# Bármely utasítás (rendszerüzenet, kinyerési, csomagolt és újrakérdező prompt) vagy séma változásakor
+# a korábbi, gyorsítótárazott eredmények érvénytelenné válnak
+PROMPT_INPUTS = [
+    SYSTEM_PROMPT,
+    INVOICE_PROMPT,
+    PACKED_PROMPT,
+    reask_prompt(["{field}"], "{page_text}", "{instructions}"),
+]
+if STRUCTURED_OUTPUT:
+    PROMPT_INPUTS += [INVOICE_SCHEMA, PAGE_TAGGED_INVOICE_SCHEMA]
+PROMPT_VERSION = hashlib.sha256(json.dumps(PROMPT_INPUTS, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+# Feltöltött számlák eredményeinek gyorsítótára (a fájl SHA-256 hash-e alapján)
+result_cache = create_cache(
+    os.getenv("RESULT_CACHE_BACKEND", "memory"),
+    path=os.getenv("RESULT_CACHE_PATH", "/tmp/invoice_cache.sqlite3"),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=int(os.getenv("RESULT_CACHE_TTL", "0")) or None,
+    table="results",
+)
+
+# Oldalszintű OpenAI válasz gyorsítótár (a normalizált oldalszöveg alapján).
+# Alapértelmezetten SQLite fájlban, így a workerek között is megosztott.
+page_cache = create_cache(
+    os.getenv("PAGE_CACHE_BACKEND", "sqlite"),
+    path=os.getenv("PAGE_CACHE_PATH", "/tmp/invoice_page_cache.sqlite3"),
+    max_bytes=int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=int(os.getenv("PAGE_CACHE_TTL", "0")) or None,
+    table="pages",
+)
+
+# Visszatérő szállítók tanult sablonjai: a megbízható sablonnal lefedett oldalakhoz nincs OpenAI hívás
+VENDOR_TEMPLATES = os.getenv("VENDOR_TEMPLATES", "1") == "1"
+vendor_templates = VendorTemplateStore(
+    os.getenv("VENDOR_TEMPLATE_DB_PATH", "/tmp/invoice_vendor_templates.sqlite3"),
+    min_verified=int(os.getenv("VENDOR_TEMPLATE_MIN_VERIFIED", "2")),
+    min_confidence=float(os.getenv("VENDOR_TEMPLATE_MIN_CONFIDENCE", "1.0")),
+    audit_rate=float(os.getenv("VENDOR_TEMPLATE_AUDIT_RATE", "0.02")),
+) if VENDOR_TEMPLATES else None
+
+# Utófeldolgozás: normalizált számok és dátumok ("Normalized") és ellenőrzések ("Validation") az eredményben
+POSTPROCESS = os.getenv("POSTPROCESS", "1") == "1"
+VALIDATION_ABS_TOLERANCE = float(os.getenv("VALIDATION_ABS_TOLERANCE", "1.0"))
+VALIDATION_REL_TOLERANCE = float(os.getenv("VALIDATION_REL_TOLERANCE", "0.005"))
+
+# Aszinkron feladatsor (POST /jobs) a lemezen; a munkaszálak a worker első kérésénél indulnak.
+# A callback URL hostjai vesszővel elválasztva (".example.com" az aldomaineket is); üresen bármely
+# host, amely csak nyilvános címre oldódik fel (a belső hálózat és a metaadat végpontok tiltottak)
+job_store = JobStore(
+    os.getenv("JOB_DB_PATH", "/tmp/invoice_jobs.sqlite3"),
+    os.getenv("JOB_DIR", "/tmp/invoice_jobs"),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    callback_hosts=[
+        host.strip().lower() for host in os.getenv("CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+    ],
+)
+
+def classify_openai_error(exc):
+    """OpenAI hibák: 429, 408, 409 és 5xx, valamint kapcsolati hibák újrapróbálhatók."""
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True, None
+    if isinstance(exc, openai.APIStatusError):
+        retryable = exc.status_code in (408, 409, 429) or exc.status_code >= 500
+        return retryable, parse_retry_after(exc.response.headers)
+    return False, None
+
+def classify_documentai_error(exc):
+    """Document AI hibák: kvóta, nem elérhető szolgáltatás, időtúllépés és belső hiba újrapróbálható."""
+    retryable = isinstance(exc, (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.GatewayTimeout,
+    ))
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    return retryable, parse_retry_after(headers)
+
+def parse_retry_after(headers):
+    """A Retry-After (vagy retry-after-ms) fejléc értéke másodpercben, ha van."""
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+# Kimenő hívások ütemezői: kvóta (kérés/perc, token/perc), újrapróbálás és circuit breaker
+openai_scheduler = OutboundScheduler(
+    "OpenAI",
+    classify_openai_error,
+    requests_per_minute=int(os.getenv("OPENAI_RPM", "500")),
+    tokens_per_minute=int(os.getenv("OPENAI_TPM", "200000")),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "5")),
+)
+documentai_scheduler = OutboundScheduler(
+    "Document AI",
+    classify_documentai_error,
+    requests_per_minute=int(os.getenv("DOCUMENTAI_RPM", "120")),
+    max_retries=int(os.getenv("DOCUMENTAI_MAX_RETRIES", "5")),
+)
+
+# A válasz várható tokenszáma a token/perc keret becsléséhez
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "1000"))
+
+# Egyszerre futó OpenAI kérések felső korlátja (oldalankénti feldolgozásnál)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Közös szálkészlet az oldalankénti OpenAI hívásokhoz: a korlát így a teljes
+# folyamatra érvényes, nem csak egy-egy kérésre
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+# Egyszerre futó Document AI kérések felső korlátja, az összes végpontra közösen
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+ocr_semaphore = threading.BoundedSemaphore(OCR_MAX_CONCURRENCY)
+
+# Nagy PDF-ek ennyi oldalas darabokban, párhuzamosan mennek OCR-re
+OCR_CHUNK_PAGES = int(os.getenv("OCR_CHUNK_PAGES", "5"))
+# A Document AI online (process_document) korlátai: efölött a PDF oldaltartományokra bontva megy
+DOCUMENTAI_ONLINE_MAX_PAGES = int(os.getenv("DOCUMENTAI_ONLINE_MAX_PAGES", "15"))
+DOCUMENTAI_ONLINE_MAX_BYTES = int(os.getenv("DOCUMENTAI_ONLINE_MAX_BYTES", str(20 * 1024 * 1024)))
+ocr_executor = ThreadPoolExecutor(max_workers=OCR_MAX_CONCURRENCY, thread_name_prefix="ocr")
+
+# Kötegelt feltöltésnél egyszerre feldolgozott dokumentumok száma; az OCR és az
+# OpenAI hívásokat a fenti közös korlátok szabályozzák
+document_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BATCH_MAX_DOCUMENTS", "8")), thread_name_prefix="document"
+)
+# Egy zip archívumban lévő PDF legnagyobb kicsomagolt mérete; a nagyobbak hibasort kapnak
+BATCH_MEMBER_MAX_BYTES = int(os.getenv("BATCH_MEMBER_MAX_BYTES", str(50 * 1024 * 1024)))
 
 def process_document_sample(project_id: str, location: str, processor_id: str, file_path: str, mime_type: str) -> list:
-    """PDF fájl feldolgozása oldalanként Google Document AI segítségével"""
-    create_gcp_credentials_file()
+    """PDF fájl feldolgozása oldalanként; az oldalak szövege oldalsorrendben.
 
-    # Google Document AI feldolgozás
-    opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
-    client = documentai.DocumentProcessorServiceClient(client_options=opts)
+    A feltöltéssel azonos úton megy (plan_document_pages, ocr_pages): a jó
+    szövegrétegű oldalak helyben, a többi darabolva, az ocr_semaphore alatt.
+    """
+    processor = (project_id, location, processor_id, mime_type)
+    _, ready_pages, ocr_chunks = plan_document_pages(file_path)
+    futures = [ocr_executor.submit(ocr_pages, load, page_nums, processor) for load, page_nums in ocr_chunks]
+    page_texts = dict(ready_pages)
+    for future in futures:
+        page_texts.update(future.result())
+    return [page_texts[page_num] for page_num in sorted(page_texts)]
 
-    name = client.processor_path(project_id, location, processor_id)
+def process_document_content(project_id: str, location: str, processor_id: str, pdf_content: bytes, mime_type: str) -> list:
+    """Memóriában lévő PDF tartalom feldolgozása oldalanként Google Document AI segítségével"""
+    client = get_documentai_client(location)
 
-    # PDF fájl beolvasása
-    with open(file_path, "rb") as pdf_file:
-        pdf_content = pdf_file.read()
+    name = client.processor_path(project_id, location, processor_id)
 
     # RawDocument létrehozása
     raw_document = documentai.RawDocument(content=pdf_content, mime_type=mime_type)
@@ -46,16 +279,29 @@ def process_document_sample(project_id: str, location: str, processor_id: str, f
     # Document AI ProcessRequest létrehozása
     request = documentai.ProcessRequest(name=name, raw_document=raw_document)
 
-    # A feldolgozási kérés elküldése a Document AI-hoz
-    result = client.process_document(request=request)
+    # A feldolgozási kérés elküldése a Document AI-hoz (újrapróbálás az ütemezőben)
+    result = documentai_scheduler.call(lambda: client.process_document(request=request, retry=None))
 
     # Dokumentum szöveges tartalmának kinyerése oldalanként
-    pages_text = [page.layout.text for page in result.document.pages]
+    return document_page_texts(result.document)
 
-    return pages_text
+def document_page_texts(document):
+    """A Document AI dokumentum oldalainak szövege."""
+    return [layout_text(page.layout, document.text) for page in document.pages]
+
+def layout_text(layout, document_text):
+    """Egy layout elem szövege: a Document AI a szöveget a text_anchor szegmenseivel adja meg."""
+    return "".join(
+        document_text[int(segment.start_index):int(segment.end_index)]
+        for segment in layout.text_anchor.text_segments
+    )
 
 def extract_pdf_pages(pdf_path):
-    """Kinyeri a PDF oldalainak szövegét egy listába."""
+    """Kinyeri a PDF oldalainak szövegét egy listába (útvonalból vagy fájl objektumból)."""
+    if isinstance(pdf_path, (str, os.PathLike)):
+        # Fájl objektumból a PdfReader csak a szükséges részeket olvassa be, útvonalból a teljes fájlt
+        with open(pdf_path, "rb") as pdf_file:
+            return extract_pdf_pages(pdf_file)
     reader = PdfReader(pdf_path)
     pages = []
 
@@ -67,115 +313,1096 @@ def extract_pdf_pages(pdf_path):
     
     return pages
 
+# Digitális PDF-eknél a beágyazott szövegréteg elég jó, ilyenkor nem kell OCR
+TEXT_LAYER_FAST_PATH = os.getenv("TEXT_LAYER_FAST_PATH", "1") == "1"
+TEXT_LAYER_MIN_SCORE = float(os.getenv("TEXT_LAYER_MIN_SCORE", "0.85"))
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", "40"))
+TEXT_LAYER_FULL_CHARS = int(os.getenv("TEXT_LAYER_FULL_CHARS", "400"))
+
+CURRENCY_PATTERN = re.compile(r"(Ft|HUF|EUR|USD|GBP|€|\$|£|\d[\d .]*[.,]\d{2}\b)", re.IGNORECASE)
+
+def text_layer_quality(text):
+    """0 és 1 közötti pontszám arra, mennyire használható egy oldal szövegrétege.
+
+    A pontszám a nyomtatható karakterek aránya, legfeljebb 15%-kal csökkentve: a
+    TEXT_LAYER_FULL_CHARS-nál rövidebb szöveg és a számok, illetve pénzösszeg/pénznem
+    hiánya csökkenti. Hibátlan szövegréteg így a küszöböt akkor is eléri, ha nincs
+    rajta szám (pl. ÁSZF vagy fedlap); a szám és a pénznem csak a részben hibás
+    szövegrétegeknél dönt. TEXT_LAYER_MIN_CHARS alatt a pontszám 0.
+    """
+    if not text:
+        return 0.0
+
+    visible = [ch for ch in text if not ch.isspace()]
+    if len(visible) < TEXT_LAYER_MIN_CHARS:
+        return 0.0
+
+    # A hibás kódolású szövegréteg tipikusan \ufffd vagy vezérlőkaraktereket tartalmaz
+    printable = sum(1 for ch in visible if ch.isprintable() and ch != "\ufffd")
+    printable_ratio = printable / len(visible)
+    length_ratio = min(1.0, len(visible) / TEXT_LAYER_FULL_CHARS)
+    has_digits = any(ch.isdigit() for ch in visible)
+    has_currency = CURRENCY_PATTERN.search(text) is not None
+
+    return printable_ratio * (0.85 + 0.05 * length_ratio + 0.05 * has_digits + 0.05 * has_currency)
+
+def pdf_pages_subset(reader, page_indices):
+    """A megadott oldalakból álló új PDF tartalma bájtokként."""
+    writer = PdfWriter()
+    for page_num in page_indices:
+        writer.add_page(reader.pages[page_num])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def pdf_page_count(pdf_source):
+    """A PDF oldalszáma a teljes fájl memóriába olvasása nélkül."""
+    if isinstance(pdf_source, (str, os.PathLike)):
+        with open(pdf_source, "rb") as pdf_file:
+            return len(PdfReader(pdf_file).pages)
+    return len(PdfReader(rewind_pdf_source(pdf_source)).pages)
+
+def pdf_chunk_loaders(pdf_source, page_nums):
+    """Legfeljebb OCR_CHUNK_PAGES (és DOCUMENTAI_ONLINE_MAX_PAGES) oldalas darabok:
+    (PDF tartalmat előállító függvény, oldalindexek) párok.
+
+    A függvény a megadott oldalindexekből álló PDF-et állítja elő; a darab PDF-je
+    csak akkor készül el, amikor a darab sorra kerül, így egy nagy dokumentumnak
+    egyszerre csak annyi darabja van a memóriában, ahány OCR kérés fut. A közös
+    forrás fájlt a lock védi.
+    """
+    lock = threading.Lock()
+    chunk_pages = min(OCR_CHUNK_PAGES, DOCUMENTAI_ONLINE_MAX_PAGES)
+
+    def load(chunk):
+        with lock:
+            if isinstance(pdf_source, (str, os.PathLike)):
+                with open(pdf_source, "rb") as pdf_file:
+                    return pdf_pages_subset(PdfReader(pdf_file), chunk)
+            return pdf_pages_subset(PdfReader(rewind_pdf_source(pdf_source)), chunk)
+
+    return [
+        (load, chunk)
+        for chunk in (page_nums[i:i + chunk_pages] for i in range(0, len(page_nums), chunk_pages))
+    ]
+
+def whole_document_loader(pdf_source):
+    """A teljes dokumentumot OCR-hez előállító függvény (kis vagy helyben nem olvasható PDF-hez)."""
+    return lambda page_nums=None: read_pdf_content(pdf_source)
+
+def ocr_request_parts(load_content, page_nums=None):
+    """A darab Document AI kérései: (PDF tartalom, oldalindexek) párok, egyszerre csak egy a memóriában.
+
+    Ha a darab PDF-je nagyobb a DOCUMENTAI_ONLINE_MAX_BYTES-nál (pl. nagy
+    felbontású szkennelt oldalak), az oldalai kettéosztva, külön kérésekben
+    mennek; az egyoldalas és a teljes dokumentumként (page_nums None) küldött
+    darab nem bontható tovább.
+    """
+    pdf_content = load_content(page_nums)
+    if page_nums is None or len(page_nums) == 1 or len(pdf_content) <= DOCUMENTAI_ONLINE_MAX_BYTES:
+        yield pdf_content, page_nums
+        return
+    print(f"OCR chunk of {len(page_nums)} pages is {len(pdf_content)} bytes, splitting it")
+    del pdf_content
+    middle = len(page_nums) // 2
+    yield from ocr_request_parts(load_content, page_nums[:middle])
+    yield from ocr_request_parts(load_content, page_nums[middle:])
+
+def ocr_pages(load_content, page_nums=None, processor=None):
+    """OCR Document AI-jal; (oldalindex, szöveg) párokat ad vissza.
+
+    A load_content a darab PDF tartalmát állítja elő (csak az OCR hely
+    megszerzése után, hogy a várakozó darabok ne foglaljanak memóriát).
+    A page_nums az eredeti dokumentum oldalindexei, amelyekből a darab
+    készül; None esetén a darab maga a teljes dokumentum. A processor
+    (projekt, régió, processzor, MIME típus) négyes, alapértelmezés a beállított processzor.
+    """
+    project_id, location, processor_id, mime_type = processor or (PROJECT_ID, LOCATION, PROCESSOR_ID, MIME_TYPE)
+    page_texts = []
+    with ocr_semaphore, STAGE_SECONDS.time(stage="ocr"):
+        for pdf_content, part_page_nums in ocr_request_parts(load_content, page_nums):
+            texts = process_document_content(project_id, location, processor_id, pdf_content, mime_type)
+            page_texts += ocr_page_texts(texts, part_page_nums)
+    return page_texts
+
+def ocr_page_texts(texts, page_nums=None):
+    """A Document AI által visszaadott oldalszövegek párosítása az eredeti oldalindexekkel."""
+    PAGES_EXTRACTED.inc(len(texts), source="ocr")
+    if page_nums is None:
+        return list(enumerate(texts))
+    if len(texts) != len(page_nums):
+        raise ValueError(f"Document AI returned {len(texts)} pages for a {len(page_nums)}-page chunk")
+    return list(zip(page_nums, texts))
+
+def start_document_pages(pdf_source):
+    """Az oldalszövegek kinyerésének elindítása.
+
+    A jó szövegrétegű oldalak azonnal rendelkezésre állnak, a többi oldal
+    OCR_CHUNK_PAGES méretű darabokban, párhuzamosan megy a Document AI-hoz.
+    Visszatérési érték: (oldalszám vagy None, kész (index, szöveg) párok,
+    OCR future-ök listája, amelyek eredménye szintén (index, szöveg) párok listája).
+    """
+    page_count, ready_pages, ocr_chunks = plan_document_pages(pdf_source)
+    ocr_futures = [ocr_executor.submit(ocr_pages, load_content, page_nums) for load_content, page_nums in ocr_chunks]
+    return page_count, ready_pages, ocr_futures
+
+def plan_document_pages(pdf_source):
+    """Eldönti, mely oldalak mennek OCR-re (OCR hívás nélkül).
+
+    Visszatérési érték: (oldalszám vagy None, kész (index, szöveg) párok,
+    OCR-re küldendő (PDF tartalmat előállító függvény, oldalindexek vagy None)
+    darabok listája). A darabok PDF-je csak az OCR kéréskor készül el.
+    """
+    try:
+        if TEXT_LAYER_FAST_PATH:
+            with STAGE_SECONDS.time(stage="text_layer"):
+                pages = [text or "" for text in extract_pdf_pages(rewind_pdf_source(pdf_source))]
+            ocr_page_nums = [
+                page_num for page_num, text in enumerate(pages)
+                if text_layer_quality(text) < TEXT_LAYER_MIN_SCORE
+            ]
+            print(f"Text layer usable on {len(pages) - len(ocr_page_nums)} of {len(pages)} pages")
+        else:
+            pages = [""] * pdf_page_count(pdf_source)
+            ocr_page_nums = list(range(len(pages)))
+    except Exception as e:
+        # Olvashatatlan PDF esetén a teljes dokumentum egyben megy OCR-re
+        print(f"PDF could not be read locally, sending the whole document to OCR: {e}")
+        return None, [], [(whole_document_loader(pdf_source), None)]
+
+    ocr_set = set(ocr_page_nums)
+    PAGES_EXTRACTED.inc(len(pages) - len(ocr_set), source="text_layer")
+    ready_pages = [(page_num, text) for page_num, text in enumerate(pages) if page_num not in ocr_set]
+
+    small_document = (
+        len(pages) <= min(OCR_CHUNK_PAGES, DOCUMENTAI_ONLINE_MAX_PAGES)
+        and pdf_size(pdf_source) <= DOCUMENTAI_ONLINE_MAX_BYTES
+    )
+    if len(ocr_page_nums) == len(pages) and small_document:
+        # Kis szkennelt dokumentum: nincs mit darabolni, az eredeti fájl megy OCR-re
+        ocr_chunks = [(whole_document_loader(pdf_source), None)]
+    else:
+        ocr_chunks = pdf_chunk_loaders(pdf_source, ocr_page_nums)
+
+    return len(pages), ready_pages, ocr_chunks
+
 @app.route('/upload_pdf', methods=['POST'])
 def upload_pdf():
-    # PDF fájl fogadása
-    if 'file' not in request.files:
+    # PDF fájl fogadása (a multipart feldolgozás és a spoolozás itt történik)
+    with STAGE_SECONDS.time(stage="save"):
+        files = request.files
+    if 'file' not in files:
         return jsonify({"error": "No file part in the request"}), 400
     
-    pdf_file = request.files.get('file')
+    pdf_file = files.get('file')
     
     if pdf_file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    # Fájl mentése átmenetileg
-    file_path = os.path.join(os.getcwd(), pdf_file.filename)
-    pdf_file.save(file_path)
+    mode = request.args.get('mode') or EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        return jsonify({"error": f"Unknown extraction mode: {mode}"}), 400
+
+    # Streamelt válasz: ?stream=ndjson|sse vagy megfelelő Accept fejléc
+    stream_format = requested_stream_format(request.args.get('stream'), request.headers.get('Accept', ''))
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return jsonify({"error": f"Unknown stream format: {stream_format}"}), 400
+
+    # A feltöltés közvetlenül a (memóriában vagy átmeneti fájlban lévő) streamből kerül feldolgozásra
+    stats = ExtractionStats(mode)
+    if stream_format is not None:
+        # A Flask a nézet visszatérésekor lezárja a feltöltött fájlt, ezért a streamelt
+        # feldolgozás saját másolaton dolgozik, amelyet a generátor zár le
+        return stream_invoice_events(spool_stream(pdf_file.stream), mode, stats, stream_format)
+
+    invoice_data = process_invoice_file(pdf_file.stream, mode=mode, stats=stats)
+
+    # Számla adatok visszaküldése JSON formátumban; a költség és idő fejlécekben
+    response = jsonify(invoice_data)
+    response.headers.update(extraction_headers(stats))
+    return response, 200
+
+def extraction_headers(stats):
+    """A feldolgozás költség- és időadatai válaszfejlécekként."""
+    stats_data = stats.as_dict()
+    return {
+        "X-Extraction-Mode": stats_data["mode"],
+        "X-LLM-Calls": str(stats_data["llm_calls"]),
+        "X-LLM-Tokens": str(stats_data["prompt_tokens"] + stats_data["completion_tokens"]),
+        "X-LLM-Cost-USD": f"{stats_data['cost_usd']:.6f}",
+        "X-Processing-Seconds": f"{stats_data['wall_seconds']:.3f}",
+    }
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def requested_stream_format(stream_format, accept):
+    """A kért streamformátum: a ?stream= paraméter, ennek hiányában az Accept fejléc alapján."""
+    if stream_format is None:
+        if "text/event-stream" in accept:
+            return "sse"
+        if "application/x-ndjson" in accept:
+            return "ndjson"
+    return stream_format
+
+def format_stream_event(event, data, stream_format):
+    """Egy esemény NDJSON sorként vagy SSE üzenetként."""
+    payload = json.dumps(data, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
+def stream_invoice_events(pdf_source, mode, stats, stream_format):
+    """A feldolgozás eseményeinek streamelése NDJSON vagy Server-Sent Events formában.
+
+    Az első esemény ("started") azonnal kimegy, így a kliens és a proxyk már az
+    OCR alatt kapnak adatot; utána oldalanként egy "page" esemény, végül a
+    "result" esemény az összefésült számlával.
+    """
+    def format_event(event, data):
+        return format_stream_event(event, data, stream_format)
 
-    # Google Document AI paraméterek
-    project_id = "gifted-country-324010"
-    location = "us"
-    processor_id = "e0bb021f188ca0d8"
-    mime_type = "application/pdf"
+    def generate():
+        try:
+            yield format_event("started", {"mode": mode})
+            for event, data in iter_invoice_events(pdf_source, mode=mode, stats=stats):
+                if event == "result":
+                    yield format_event("stats", stats.as_dict())
+                yield format_event(event, data)
+        except Exception as e:
+            print(f"Streaming extraction failed: {e}")
+            yield format_event("error", {"error": "An error occurred while processing the invoice data."})
+        finally:
+            pdf_source.close()
+
+    response = Response(generate(), mimetype=STREAM_FORMATS[stream_format])
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """Több számla feldolgozása egy kérésben (több fájl vagy zip archívum).
+
+    Az eredmények NDJSON formában, dokumentumonként egy sorban érkeznek,
+    abban a sorrendben, ahogy az egyes dokumentumok elkészülnek.
+    """
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    uploads = [upload for upload in uploads if upload.filename != '']
+    if not uploads:
+        return jsonify({"error": "No file part in the request"}), 400
+
+    try:
+        documents, spooled = spool_batch_uploads(uploads)
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Invalid zip archive"}), 400
+
+    if not documents:
+        for spooled_file in spooled:
+            spooled_file.close()
+        return jsonify({"error": "No PDF files in the request"}), 400
+
+    def generate():
+        futures = {
+            document_executor.submit(process_batch_document, open_document): (index, filename)
+            for index, (filename, open_document, error) in enumerate(documents)
+            if error is None
+        }
+        try:
+            for index, (filename, _, error) in enumerate(documents):
+                if error is not None:
+                    yield json.dumps({"index": index, "filename": filename, "error": error}, ensure_ascii=False) + "\n"
+            for future in as_completed(futures):
+                index, filename = futures[future]
+                line = {"index": index, "filename": filename}
+                try:
+                    line["result"] = future.result()
+                except Exception as e:
+                    print(f"Batch document {filename} failed: {e}")
+                    line["error"] = f"Failed to process {filename}"
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            # Megszakadt kapcsolat esetén a még el nem indult dokumentumokat nem dolgozzuk fel
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled():
+                    try:
+                        future.result()
+                    except Exception:
+                        pass
+            for spooled_file in spooled:
+                spooled_file.close()
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+def process_batch_document(open_document):
+    """Egy kötegelt dokumentum feldolgozása; a stream (zip tagnál a kicsomagolás) csak itt nyílik meg."""
+    with open_document() as pdf_stream:
+        return process_invoice_file(pdf_stream)
 
-    # PDF oldalainak feldolgozása Google Document AI segítségével
-    document_pages = process_document_sample(project_id, location, processor_id, file_path, mime_type)
+def spool_stream(src):
+    """A stream másolata egy saját SpooledTemporaryFile-ba (a kérés lezárása után is olvasható)."""
+    pdf_stream = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, mode="rb+")
+    shutil.copyfileobj(src, pdf_stream)
+    pdf_stream.seek(0)
+    return pdf_stream
+
+def spool_batch_uploads(uploads):
+    """A feltöltött PDF-ek (és a zip archívumokban lévő PDF-ek) átvétele.
+
+    (dokumentumok, lezárandó fájlok) párt ad vissza; a dokumentumok
+    (fájlnév, megnyitó, hiba) hármasok. A kérés fájljai a válasz streamelése
+    előtt lezárulnak, ezért minden feltöltött fájl (a zip archívum egészében)
+    saját SpooledTemporaryFile-ba kerül; a zip tagok csak akkor csomagolódnak ki,
+    amikor a dokumentum feldolgozása elkezdődik, így egyszerre csak a
+    folyamatban lévők foglalnak helyet. A BATCH_MEMBER_MAX_BYTES-nál nagyobb
+    tagok nem csomagolódnak ki, hibát kapnak.
+    """
+    documents = []
+    spooled = []
+
+    try:
+        for upload in uploads:
+            upload_stream = spool_stream(upload.stream)
+            spooled.append(upload_stream)
+            if not upload.filename.lower().endswith(".zip"):
+                documents.append((upload.filename, lambda stream=upload_stream: stream, None))
+                continue
+            archive = zipfile.ZipFile(upload_stream)
+            spooled.append(archive)
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                    continue
+                if member.file_size > BATCH_MEMBER_MAX_BYTES:
+                    error = f"{member.filename} exceeds the {BATCH_MEMBER_MAX_BYTES} byte limit"
+                    documents.append((member.filename, None, error))
+                    continue
+                documents.append((member.filename, functools.partial(open_zip_member, archive, member), None))
+    except Exception:
+        for spooled_file in spooled:
+            spooled_file.close()
+        raise
+
+    return documents, spooled
+
+def open_zip_member(archive, member):
+    """Egy zip tag kicsomagolása saját SpooledTemporaryFile-ba.
+
+    A ZipExtFile legfeljebb a központi könyvtárban megadott méretet adja ki,
+    így a BATCH_MEMBER_MAX_BYTES korlát hamis fejléccel sem kerülhető meg.
+    """
+    with archive.open(member) as src:
+        return spool_stream(src)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Aszinkron feldolgozás: a fájl sorba kerül, a válasz azonnal a feladat azonosítója."""
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request"}), 400
+
+    pdf_file = request.files.get('file')
 
-    # Logoljuk a kinyert OCR szöveget
-    print("Google Document AI extracted text from pages:", document_pages)
+    if pdf_file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
 
-    # Az átmenetileg mentett fájl törlése
-    os.remove(file_path)
+    callback_url = request.form.get('callback_url') or None
 
-    # Oldalankénti OpenAI feldolgozás
-    invoice_data = extract_invoice_data_per_page(document_pages)
+    try:
+        job_id = job_store.create(pdf_file.filename, pdf_file, callback_url)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job_workers.notify()
 
-    # Számla adatok visszaküldése JSON formátumban
-    return jsonify(invoice_data), 200
+    return jsonify({"id": job_id, "status": "queued"}), 202
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """A feladat állapota, haladása és eredménye."""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
 
-def extract_invoice_data_per_page(document_pages):
-    """Oldalanként dolgozza fel az OCR szöveget az OpenAI API-n keresztül."""
-    full_response = []
+@app.route('/export', methods=['GET', 'POST'])
+def export_results():
+    """Eredmények exportálása XLSX, CSV vagy Parquet fájlba (?format=xlsx|csv|parquet).
 
-    for page_num, page_text in enumerate(document_pages):
-        print(f"Processing page {page_num + 1} of {len(document_pages)}")
+    POST: a kérés törzse NDJSON (pl. /upload_batch kimenet), soronként olvasva.
+    GET: a kész aszinkron feladatok eredményei (?since=&until= Unix időbélyeg).
+    A fájl darabonként íródik egy ideiglenes fájlba, így a memóriahasználat állandó.
+    """
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}), 400
 
+    if request.method == 'POST':
+        records = read_records(io.TextIOWrapper(request.stream, encoding="utf-8"))
+    else:
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI that extracts invoice data."
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            "Here is part of the text of an invoice. Please extract the following information as structured data:\n"
-                            "1. Invoice Date (if not present, return '-')\n"
-                            "2. PO Number (if not present, return '-')\n"
-                            "3. Seller Company Name (if not present, return '-')\n"
-                            "4. Seller Company Address (if not present, return '-')\n"
-                            "5. Seller Tax No. (if not present, return '-')\n"
-                            "6. Buyer Company Name (if not present, return '-')\n"
-                            "7. Buyer Company Address (if not present, return '-')\n"
-                            "8. Buyer Tax No. (if not present, return '-')\n"
-                            "9. Items with structured information (if items are not present, return '-'): \n"
-                            "   - description as 'description'\n"
-                            "   - quantity (without unit) as 'quantity'\n"
-                            "   - unit as 'unit'\n"
-                            "   - price per unit as 'price'\n"
-                            "   - full amount as 'amount'\n"
-                            "10. VAT percent (if there is no VAT information, return '-')\n"
-                            "11. Subtotal excluded VAT (if not present, return '-')\n"
-                            "12. Total included VAT (if not present, return '-')\n"
-                            "13. Shipping Cost (if not present, return '-')\n\n"
-                            f"Text of the invoice:\n{page_text}"
-                        )
-                    }
-                ]
+            since = float(request.args['since']) if request.args.get('since') else None
+            until = float(request.args['until']) if request.args.get('until') else None
+        except ValueError:
+            return jsonify({"error": "since and until must be Unix timestamps"}), 400
+        records = job_store.iter_results(since, until)
+
+    out = tempfile.TemporaryFile()
+    try:
+        export_invoices(records, export_format, out)
+    except (ValueError, UnicodeDecodeError) as e:
+        out.close()
+        print(f"Export failed: {e}")
+        return jsonify({"error": "Invalid NDJSON input"}), 400
+    out.seek(0)
+    return send_file(
+        out, mimetype=EXPORT_FORMATS[export_format], as_attachment=True,
+        download_name=f"invoices.{export_format}",
+    )
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """A gyorsítótár találati és hiány számlálói."""
+    return jsonify(cache_stats_data()), 200
+
+def cache_stats_data():
+    data = {
+        "results": result_cache.stats.as_dict(),
+        "pages": page_cache.stats.as_dict(),
+    }
+    if vendor_templates is not None:
+        data["vendor_templates"] = vendor_templates.stats.as_dict()
+    return data
+
+def rewind_pdf_source(pdf_source):
+    """Fájl objektum esetén az elejére teker; útvonalat változatlanul ad vissza."""
+    if not isinstance(pdf_source, (str, os.PathLike)):
+        pdf_source.seek(0)
+    return pdf_source
+
+def read_pdf_content(pdf_source):
+    """A PDF teljes tartalma bájtokként (útvonalból vagy fájl objektumból)."""
+    if isinstance(pdf_source, (str, os.PathLike)):
+        with open(pdf_source, "rb") as f:
+            return f.read()
+    return rewind_pdf_source(pdf_source).read()
+
+def pdf_size(pdf_source):
+    """A fájl mérete bájtokban (útvonalból vagy visszatekerhető fájl objektumból)."""
+    if isinstance(pdf_source, (str, os.PathLike)):
+        return os.path.getsize(pdf_source)
+    return rewind_pdf_source(pdf_source).seek(0, io.SEEK_END)
+
+def file_sha256(pdf_source):
+    """A fájl tartalmának SHA-256 hash-e, darabonként olvasva."""
+    digest = hashlib.sha256()
+    if isinstance(pdf_source, (str, os.PathLike)):
+        with open(pdf_source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        rewind_pdf_source(pdf_source)
+        for chunk in iter(lambda: pdf_source.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def iter_invoice_events(pdf_source, mode=None, stats=None):
+    """Egy PDF számla teljes feldolgozása eseményekként: OCR, oldalankénti OpenAI kinyerés és összefésülés.
+
+    (esemény, adat) párokat ad vissza: "pages" (oldalszám, ha a PDF helyben olvasható), "page"
+    (egy oldal eredménye, amint elkészül) és végül "result" (az összefésült számla).
+    A pdf_source fájl útvonal vagy visszatekerhető bináris fájl objektum lehet.
+    Ugyanannak a fájlnak az ismételt feltöltésekor az eredmény a gyorsítótárból
+    jön, sem a Document AI-t, sem az OpenAI-t nem hívjuk.
+    """
+    mode = mode or EXTRACTION_MODE
+    result_key, ocr_key, invoice_data, document_pages = lookup_invoice(pdf_source, mode)
+    if invoice_data is not None:
+        yield "result", finalize_invoice(invoice_data)
+        return
+
+    if document_pages is not None:
+        page_count, ready_pages, ocr_futures = len(document_pages), list(enumerate(document_pages)), []
+    else:
+        # Szövegréteg azonnal, a többi oldal darabonként Google Document AI OCR-rel
+        page_count, ready_pages, ocr_futures = start_document_pages(pdf_source)
+    yield "pages", {"page_count": page_count}
+
+    # Oldalankénti (vagy csomagolt) OpenAI feldolgozás, amint egy-egy oldal szövege megvan
+    stats = stats if stats is not None else ExtractionStats(mode)
+    page_texts = {}
+    page_results = {}
+    for page_num, page_result in iter_page_pipeline(
+        page_texts, ready_pages, ocr_futures, page_count=page_count, mode=mode, stats=stats
+    ):
+        page_results[page_num] = page_result
+        yield "page", {"page": page_num + 1, **page_result}
+
+    yield "result", complete_invoice(page_results, page_texts, document_pages, result_key, ocr_key, stats)
+
+def lookup_invoice(pdf_source, mode):
+    """A PDF tartalom hash-e alapján a gyorsítótárban lévő eredmény és OCR szöveg.
+
+    (result_key, ocr_key, számla, oldalszövegek) négyest ad vissza; a számla és
+    az oldalszövegek None-ok, ha nincsenek a gyorsítótárban (kész számlánál az
+    oldalszövegeket nem olvassuk ki). A Flask és az ASGI alkalmazás közös lépése.
+    """
+    with STAGE_SECONDS.time(stage="hash"):
+        content_hash = file_sha256(pdf_source)
+    result_key = f"result:{content_hash}:{OPENAI_MODEL}:{PROMPT_VERSION}:{mode}"
+    ocr_key = f"ocr:{content_hash}"
+
+    invoice_data = result_cache.get(result_key)
+    if invoice_data is not None:
+        return result_key, ocr_key, invoice_data, None
+
+    # Az OCR eredmény független az utasítástól, így modell- vagy promptváltás után is használható
+    return result_key, ocr_key, None, result_cache.get(ocr_key)
+
+def complete_invoice(page_results, page_texts, document_pages, result_key, ocr_key, stats):
+    """Az oldaleredmények összefésülése és gyorsítótárazása; az utófeldolgozott számlát adja vissza.
+
+    A page_results oldalindex -> eredmény szótár; ha a document_pages None, az
+    OCR szöveg a page_texts szótárból kerül a gyorsítótárba.
+    """
+    if document_pages is None:
+        document_pages = [page_texts[page_num] for page_num in sorted(page_texts)]
+        result_cache.set(ocr_key, document_pages)
+
+    # A kinyert szöveget csak hibakereső módban naplózzuk
+    if LOG_PAYLOADS:
+        print("Extracted text from pages:", document_pages)
+
+    page_results = [page_results[page_num] for page_num in sorted(page_results)]
+    with STAGE_SECONDS.time(stage="merge"):
+        invoice_data = merge_responses(page_results)
+    print("Extraction stats:", stats.as_dict())
+
+    # Hibás oldalt tartalmazó eredményt nem tárolunk, hogy a következő feltöltés újrapróbálhassa
+    if not any("error" in page_result for page_result in page_results):
+        result_cache.set(result_key, invoice_data)
+
+    return finalize_invoice(invoice_data)
+
+def finalize_invoice(invoice_data):
+    """Utófeldolgozás az összefésült számlán; a gyorsítótárba az utófeldolgozás előtti eredmény kerül."""
+    if not POSTPROCESS:
+        return invoice_data
+    try:
+        with STAGE_SECONDS.time(stage="postprocess"):
+            return postprocess_invoice(invoice_data, VALIDATION_ABS_TOLERANCE, VALIDATION_REL_TOLERANCE)
+    except Exception as e:
+        print(f"Post-processing failed, returning the raw result: {e}")
+        return invoice_data
+
+def process_invoice_file(pdf_source, progress=None, mode=None, stats=None):
+    """Egy PDF számla teljes feldolgozása; az összefésült számla adatokat adja vissza.
+
+    A progress(kész, összes) visszahívás minden elkészült oldal után meghívódik.
+    """
+    page_count = 0
+    pages_done = 0
+    for event, data in iter_invoice_events(pdf_source, mode=mode, stats=stats):
+        if event == "pages":
+            page_count = data["page_count"]
+            if progress is not None:
+                progress(0, page_count)
+        elif event == "page":
+            pages_done += 1
+            if progress is not None:
+                progress(pages_done, page_count)
+        elif event == "result":
+            return data
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def start_job_workers():
+    # A munkaszálak a worker folyamat első (bármilyen) kérésénél indulnak, így egy újraindítás után a
+    # sorban maradt és a lejárt bérletű feladatok feldolgozása /jobs kérés nélkül is folytatódik
+    job_workers.start()
+
+@app.after_request
+def observe_request_time(response):
+    started = g.get("request_started")
+    if started is not None and request.endpoint != "metrics":
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, endpoint=request.endpoint or "unknown", status=str(response.status_code)
+        )
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrikák Prometheus szöveges formátumban (a kiszolgáló worker folyamatra vonatkozóan)."""
+    return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
+
+CallbackCounter(
+    "invoice_cache_requests_total",
+    "Cache lookups by cache and outcome.",
+    ["cache", "outcome"],
+    lambda: {
+        (name, outcome): value
+        for name, cache in (("results", result_cache), ("pages", page_cache), ("vendor_templates", vendor_templates))
+        if cache is not None
+        for outcome, value in (("hit", cache.stats.hits), ("miss", cache.stats.misses))
+    },
+)
+
+# A feladatsor munkaszálai ugyanazt a feldolgozást futtatják, mint az /upload_pdf
+job_workers = JobWorkerPool(
+    job_store,
+    process_invoice_file,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    lease_seconds=int(os.getenv("JOB_LEASE_SECONDS", "600")),
+)
+
+def llm_cost(prompt_tokens, completion_tokens):
+    """Becsült OpenAI költség USD-ben."""
+    return (prompt_tokens * OPENAI_INPUT_COST_PER_1M + completion_tokens * OPENAI_OUTPUT_COST_PER_1M) / 1_000_000
+
+class ExtractionStats:
+    """Egy dokumentum OpenAI hívásainak száma, tokenhasználata, költsége és ideje."""
+
+    def __init__(self, mode=None):
+        self._lock = threading.Lock()
+        self.mode = mode or EXTRACTION_MODE
+        self.started = time.monotonic()
+        self.llm_calls = 0
+        self.fallback_pages = 0
+        self.reasked_fields = 0
+        self.template_pages = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_seconds = 0.0
+
+    def record_call(self, response, seconds):
+        usage = getattr(response, "usage", None)
+        prompt_tokens = (usage.prompt_tokens or 0) if usage is not None else 0
+        completion_tokens = (usage.completion_tokens or 0) if usage is not None else 0
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+        # Folyamatszintű számlálók a /metrics végponthoz
+        LLM_TOKENS.inc(prompt_tokens, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, type="completion")
+        LLM_COST.inc(llm_cost(prompt_tokens, completion_tokens))
+
+    def record_reask(self, field_count):
+        with self._lock:
+            self.reasked_fields += field_count
+
+    def record_fallback(self, page_count):
+        with self._lock:
+            self.fallback_pages += page_count
+
+    def record_template(self):
+        with self._lock:
+            self.template_pages += 1
+
+    def as_dict(self):
+        with self._lock:
+            cost = llm_cost(self.prompt_tokens, self.completion_tokens)
+            return {
+                "mode": self.mode,
+                "llm_calls": self.llm_calls,
+                "fallback_pages": self.fallback_pages,
+                "reasked_fields": self.reasked_fields,
+                "template_pages": self.template_pages,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost_usd": round(cost, 6),
+                "llm_seconds": round(self.llm_seconds, 3),
+                "wall_seconds": round(time.monotonic() - self.started, 3),
+            }
+
+def request_invoice_completion(content, stats=None, schema=None):
+    """Egy OpenAI chat completion kérés a számla-kinyerő rendszerüzenettel; a válasz szövegét adja vissza.
+
+    Ha schema meg van adva, a válasz a sémának megfelelő JSON (structured output).
+    """
+    started = time.monotonic()
+    try:
+        with STAGE_SECONDS.time(stage="llm"):
+            response = openai_scheduler.call(
+                lambda: client.chat.completions.create(**invoice_completion_kwargs(content, schema)),
+                tokens=estimate_tokens(content) + LLM_COMPLETION_TOKENS_ESTIMATE,
             )
+    except Exception:
+        LLM_REQUESTS.inc(outcome="error")
+        raise
+    LLM_REQUESTS.inc(outcome="ok")
+    if stats is not None:
+        stats.record_call(response, time.monotonic() - started)
+    return response.choices[0].message.content
 
-            response_text = response.choices[0].message.content
-            print(f"OpenAI response for page {page_num + 1}:", response_text)
+def invoice_completion_kwargs(content, schema=None):
+    """A számla-kinyerő chat completion kérés paraméterei."""
+    kwargs = {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+    }
+    if schema is not None:
+        kwargs["response_format"] = response_format(schema)
+    return kwargs
 
-            # Tisztítási művelet
-            cleaned_response_text = response_text.replace("```json", "").replace("```", "").strip()
-            full_response.append(json.loads(cleaned_response_text))
+def parse_invoice_json(response_text):
+    """A modell válaszának JSON-ná alakítása a ```json keretezés eltávolítása után."""
+    # Tisztítási művelet
+    cleaned_response_text = response_text.replace("```json", "").replace("```", "").strip()
+    return json.loads(cleaned_response_text)
 
+def run_completion_steps(steps, stats=None):
+    """Kinyerési lépések (lásd page_data_steps) végrehajtása szinkron OpenAI hívásokkal; az eredményt adja."""
+    response_text, error = None, None
+    while True:
+        try:
+            content, schema = steps.throw(error) if error is not None else steps.send(response_text)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            response_text, error = request_invoice_completion(content, stats, schema), None
         except Exception as e:
-            print(f"An error occurred on page {page_num + 1}: {e}")
-            full_response.append({"error": f"Failed to process page {page_num + 1}"})
+            response_text, error = None, e
+
+def parse_invoice_response_steps(response_text, page_text, schema, stats=None, instructions=""):
+    """A modell válaszának értelmezése; strukturált módban sémaellenőrzéssel és célzott újrakérdezéssel.
+
+    Csak a hibásan visszaadott mezőket kérdezzük újra (az instructions kiegészítéssel,
+    pl. a csomagolt mód oldaljelölésével); ami másodszorra sem jó, az '-' lesz.
+    """
+    with STAGE_SECONDS.time(stage="parse"):
+        if not STRUCTURED_OUTPUT:
+            return parse_invoice_json(response_text)
+
+        invoice_data, invalid_fields = parse_invoice(response_text, schema)
+    if invalid_fields:
+        print(f"Re-asking malformed fields: {invalid_fields}")
+        if stats is not None:
+            stats.record_reask(len(invalid_fields))
+        reask_text = yield (
+            reask_prompt(invalid_fields, page_text, instructions), subset_schema(schema, invalid_fields)
+        )
+        invoice_data.update(parse_reasked_fields(reask_text, invalid_fields, schema))
+    return invoice_data
+
+def page_data_steps(page_num, page_text, page_count, stats=None):
+    """Egyetlen oldal kinyerésének lépései, hálózati hívás nélkül.
+
+    Generátor: minden OpenAI kéréshez (tartalom, séma) párt ad ki, és a válasz
+    szövegét kapja vissza (hiba esetén a kivételt); a visszatérési értéke az oldal
+    eredménye. A Flask alkalmazás a run_completion_steps, az ASGI alkalmazás a
+    saját aszinkron végrehajtójával futtatja, így a logika közös.
+    """
+    print(f"Processing page {page_num + 1} of {page_count}")
+
+    try:
+        response_text = yield (
+            INVOICE_PROMPT + f"Text of the invoice:\n{page_text}",
+            INVOICE_SCHEMA if STRUCTURED_OUTPUT else None,
+        )
+        if LOG_PAYLOADS:
+            print(f"OpenAI response for page {page_num + 1}:", response_text)
+
+        return (yield from parse_invoice_response_steps(response_text, page_text, INVOICE_SCHEMA, stats))
+
+    except Exception as e:
+        # A hiba csak az adott oldalt érinti, a többi oldal feldolgozása folytatódik
+        print(f"An error occurred on page {page_num + 1}: {e}")
+        return {"error": f"Failed to process page {page_num + 1}"}
+
+def extract_page_data(page_num, page_text, page_count, stats=None):
+    """Egyetlen oldal OCR szövegének feldolgozása az OpenAI API-n keresztül."""
+    return run_completion_steps(page_data_steps(page_num, page_text, page_count, stats), stats)
+
+def page_cache_key(page_text):
+    """Oldalszintű gyorsítótár kulcs: a whitespace-normalizált szöveg, a modell és a prompt hash-e."""
+    normalized_text = " ".join(page_text.split())
+    digest = hashlib.sha256(f"{OPENAI_MODEL}\0{PROMPT_VERSION}\0{normalized_text}".encode("utf-8"))
+    return f"page:{digest.hexdigest()}"
+
+def extract_page_data_cached(page_num, page_text, page_count, stats=None):
+    """Oldal feldolgozása, ha a szöveg már szerepelt korábban, a gyorsítótárból."""
+    page_result = cached_page_data(page_num, page_text, page_count, stats)
+    if page_result is None:
+        page_result = extract_page_data(page_num, page_text, page_count, stats)
+        store_page_data(page_text, page_result)
+    return page_result
+
+def cached_page_data(page_num, page_text, page_count, stats=None):
+    """Az oldal eredménye a gyorsítótárból vagy a szállítói sablonból; None, ha az OpenAI-hoz kell fordulni."""
+    page_result = page_cache.get(page_cache_key(page_text))
+    if page_result is not None:
+        print(f"Page {page_num + 1} of {page_count} served from page cache")
+        return page_result
+    return template_page_data(page_num, page_text, page_count, stats)
+
+def store_page_data(page_text, page_result):
+    """Az OpenAI-tól kapott hibátlan oldaleredmény gyorsítótárazása és a szállítói sablon tanítása."""
+    if "error" not in page_result:
+        page_cache.set(page_cache_key(page_text), page_result)
+        learn_vendor_template(page_text, page_result)
+
+def template_page_data(page_num, page_text, page_count, stats=None):
+    """Oldal kinyerése a szállító megbízható sablonjával; None, ha nincs ilyen sablon."""
+    if vendor_templates is None:
+        return None
+    with STAGE_SECONDS.time(stage="template"):
+        page_result = vendor_templates.extract(page_text)
+    if page_result is not None:
+        print(f"Page {page_num + 1} of {page_count} extracted with vendor template")
+        if stats is not None:
+            stats.record_template()
+    return page_result
+
+def learn_vendor_template(page_text, page_result):
+    """Az LLM eredményéből a szállítói sablon ellenőrzése vagy tanulása; hiba esetén csak naplózunk."""
+    if vendor_templates is None:
+        return
+    try:
+        vendor_templates.learn(page_text, page_result)
+    except Exception as e:
+        print(f"Vendor template learning failed: {e}")
+
+def estimate_tokens(text):
+    """Durva tokenbecslés (kb. 4 karakter / token), tokenizer nélkül."""
+    return len(text) // 4 + 1
+
+def pack_pages(page_nums, document_pages):
+    """Az egymást követő oldalak csoportosítása úgy, hogy egy csoport beleférjen a tokenkeretbe."""
+    budget = LLM_PACK_TOKEN_BUDGET - estimate_tokens(INVOICE_PROMPT + PACKED_PROMPT)
+    groups = []
+    current = []
+    current_tokens = 0
+    for page_num in page_nums:
+        page_tokens = estimate_tokens(document_pages[page_num]) + 8  # oldaljelölő sor
+        if current and (current_tokens + page_tokens > budget or len(current) >= LLM_PACK_MAX_PAGES):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(page_num)
+        current_tokens += page_tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def extract_page_group_data(group, document_pages, page_count, stats=None):
+    """Több oldal feldolgozása egyetlen OpenAI kéréssel; oldalszám -> eredmény szótárat ad vissza.
+
+    Ha a válasz nem értelmezhető, a csoport oldalai egyenként kerülnek feldolgozásra.
+    """
+    if len(group) == 1:
+        page_num = group[0]
+        return {page_num: extract_page_data_cached(page_num, document_pages[page_num], page_count, stats)}
+
+    page_results = run_completion_steps(page_group_steps(group, document_pages, page_count, stats), stats)
+    if page_results is None:
+        page_results = {
+            page_num: extract_page_data_cached(page_num, document_pages[page_num], page_count, stats)
+            for page_num in group
+        }
+    return page_results
+
+def page_group_steps(group, document_pages, page_count, stats=None):
+    """Több oldal kinyerésének lépései egyetlen kérésben (lásd page_data_steps).
+
+    Oldalszám -> eredmény szótárat ad vissza, vagy None-t, ha a válasz nem
+    értelmezhető, és a csoport oldalait egyenként kell feldolgozni.
+    """
+    print(f"Processing pages {group[0] + 1}-{group[-1] + 1} of {page_count} in one request")
+    page_texts = packed_page_texts(group, document_pages)
+
+    try:
+        response_text = yield (
+            INVOICE_PROMPT + PACKED_PROMPT + f"Text of the invoice:\n{page_texts}",
+            PAGE_TAGGED_INVOICE_SCHEMA if STRUCTURED_OUTPUT else None,
+        )
+        if LOG_PAYLOADS:
+            print(f"OpenAI response for pages {group[0] + 1}-{group[-1] + 1}:", response_text)
+        group_result = yield from parse_invoice_response_steps(
+            response_text, page_texts, PAGE_TAGGED_INVOICE_SCHEMA, stats, instructions=PACKED_PROMPT
+        )
+        return split_page_group_result(group_result, group)
+
+    except Exception as e:
+        print(f"Packed request failed for pages {group[0] + 1}-{group[-1] + 1}, falling back to per-page: {e}")
+        if stats is not None:
+            stats.record_fallback(len(group))
+        return None
+
+def packed_page_texts(group, document_pages):
+    """A csoport oldalainak szövege oldaljelölő sorokkal elválasztva."""
+    return "".join(f"=== Page {page_num + 1} ===\n{document_pages[page_num]}\n" for page_num in group)
+
+def split_page_group_result(group_result, group):
+    """Az oldaljelölt tételeket tartalmazó csoportválasz szétbontása oldalankénti eredményekre.
+
+    A tételek a jelölt oldalukra kerülnek, a fejlécmezők csak a csoport első oldalára.
+    """
+    items = group_result.get("Items", "-")
+    if items in ("-", None):
+        items = []
+    if not isinstance(items, list):
+        raise ValueError("Items is not a list")
+
+    items_by_page = {page_num: [] for page_num in group}
+    for item in items:
+        item = dict(item)
+        page_num = int(item.pop("page")) - 1
+        if page_num not in items_by_page:
+            raise ValueError(f"Item tagged with unexpected page {page_num + 1}")
+        items_by_page[page_num].append(item)
+
+    # A fejlécet a modell egyszer adta meg a csoportra, ezért csak a csoport első oldala kapja meg,
+    # hogy az összefésülésnél ne szavazzon oldalanként újra; a többi oldalon minden fejlécmező '-'
+    header = {key: value for key, value in group_result.items() if key != "Items"}
+    empty_header = dict.fromkeys(header, "-")
+    return {
+        page_num: {**(header if page_num == group[0] else empty_header), "Items": items_by_page[page_num] or "-"}
+        for page_num in group
+    }
+
+def iter_page_pipeline(page_texts, ready_pages, ocr_futures, page_count=None, mode=None, stats=None):
+    """OCR és OpenAI kinyerés futószalagon: (oldalindex, eredmény) párokat ad vissza befejezési sorrendben.
+
+    A ready_pages oldalai azonnal, az OCR future-ök oldalai pedig abban a
+    pillanatban kerülnek az OpenAI-hoz, amint az adott darab OCR-je elkészült,
+    így a teljes idő nagyjából max(OCR, LLM), nem OCR + LLM. A page_texts
+    szótárba bekerül minden oldal szövege.
+
+    mode="per_page" esetén minden oldal külön kérés, mode="packed" esetén az
+    egyszerre beérkező oldalak tokenkeretbe csomagolva, csoportonként egy
+    kérésben mennek. Ha a hívó idő előtt abbahagyja a bejárást, a még el nem
+    indult kérések törlődnek.
+    """
+    mode = mode or EXTRACTION_MODE
+    pages = DocumentPages(page_texts)
+    pending = set(ocr_futures)
+    ocr_pending = set(ocr_futures)
+
+    def submit_pages(batch):
+        ready, groups = pages.schedule(batch, mode, page_count, stats)
+        for group in groups:
+            pending.add(llm_executor.submit(extract_page_group_data, group, page_texts, page_count, stats))
+        return ready
+
+    try:
+        yield from submit_pages(ready_pages)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                if future in ocr_pending:
+                    ocr_pending.discard(future)
+                    yield from submit_pages(future.result())
+                    continue
+                for first_page, page_result in future.result().items():
+                    yield from pages.resolve(first_page, page_result)
+    finally:
+        for future in pending:
+            future.cancel()
+
+class DocumentPages:
+    """Egy dokumentum oldalszövegei; a dokumentumon belül ismétlődő oldalakat (pl. ÁSZF,
+    fejléc) csak egyszer küldjük el, az eredményt minden előfordulás megkapja.
+    """
+
+    def __init__(self, page_texts):
+        self.page_texts = page_texts
+        self.page_keys = {}
+        self.pages_by_key = {}
+        self.results_by_key = {}
+
+    def add(self, batch):
+        """Újonnan beérkezett (index, szöveg) párok; (kész (index, eredmény) párok, feldolgozandó oldalak)."""
+        ready = []
+        new_pages = []
+        for page_num, page_text in batch:
+            self.page_texts[page_num] = page_text
+            key = page_cache_key(page_text)
+            self.page_keys[page_num] = key
+            if key not in self.pages_by_key:
+                self.pages_by_key[key] = [page_num]
+                new_pages.append(page_num)
+                continue
+            self.pages_by_key[key].append(page_num)
+            if key in self.results_by_key:
+                ready.append((page_num, self._result_for(page_num, key)))
+        return ready, new_pages
+
+    def schedule(self, batch, mode, page_count=None, stats=None):
+        """Új (index, szöveg) párok; (kész (index, eredmény) párok, az OpenAI-hoz küldendő oldalcsoportok).
+
+        per_page módban minden csoport egyetlen oldal (a gyorsítótárat az
+        extract_page_data_cached nézi meg); packed módban a gyorsítótárban lévő és a
+        sablonnal kinyerhető oldalakat nem csomagoljuk újra. Gyorsítótárat olvashat.
+        """
+        ready, new_pages = self.add(batch)
+        if mode != "packed":
+            return ready, [[page_num] for page_num in new_pages]
+        cached, new_pages = self.from_page_cache(new_pages)
+        templated, new_pages = self.from_vendor_templates(new_pages, page_count, stats)
+        return ready + cached + templated, pack_pages(new_pages, self.page_texts)
+
+    def from_page_cache(self, page_nums):
+        """Az oldalgyorsítótárban megtalált oldalak; (kész (index, eredmény) párok, hiányzó oldalak)."""
+        ready = []
+        uncached_pages = []
+        for page_num in page_nums:
+            page_result = page_cache.get(self.page_keys[page_num])
+            if page_result is not None:
+                # Az ugyanebben a kötegben érkezett ismétlődő oldalak is megkapják az eredményt
+                ready.extend(self.resolve(page_num, page_result))
+            else:
+                uncached_pages.append(page_num)
+        return ready, uncached_pages
 
-    return merge_responses(full_response)
+    def from_vendor_templates(self, page_nums, page_count=None, stats=None):
+        """A szállítói sablonnal kinyerhető oldalak; (kész (index, eredmény) párok, maradék oldalak)."""
+        ready = []
+        remaining_pages = []
+        for page_num in page_nums:
+            page_result = template_page_data(page_num, self.page_texts[page_num], page_count, stats)
+            if page_result is not None:
+                ready.extend(self.resolve(page_num, page_result))
+            else:
+                remaining_pages.append(page_num)
+        return ready, remaining_pages
 
-def merge_responses(responses):
-    """Összefésüli a válaszokat, hogy egy struktúrált JSON-t adjon vissza."""
-    if not responses:
-        return {}
+    def resolve(self, first_page, page_result):
+        """Egy feldolgozott oldal eredménye; az összes azonos szövegű oldal (index, eredmény) párja."""
+        key = self.page_keys[first_page]
+        self.results_by_key[key] = page_result
+        return [(page_num, self._result_for(page_num, key)) for page_num in self.pages_by_key[key]]
 
-    final_response = responses[0]  # Az első válaszból indulunk ki
+    def _result_for(self, page_num, key):
+        # Az ismétlődő oldalak saját másolatot kapnak, hogy az összefésülés ne írja felül egymást
+        page_result = self.results_by_key[key]
+        return page_result if page_num == self.pages_by_key[key][0] else copy.deepcopy(page_result)
 
-    # Több részből álló tételek (Items) összeillesztése
-    all_items = []
-    for response in responses:
-        if "Items" in response and response["Items"] != "-":
-            all_items.extend(response["Items"])
+def iter_page_results(document_pages, mode=None, stats=None):
+    """Párhuzamosan dolgozza fel a kész OCR szöveget; (oldalindex, eredmény) párokat ad vissza befejezési sorrendben."""
+    yield from iter_page_pipeline(
+        {}, list(enumerate(document_pages)), [], page_count=len(document_pages), mode=mode, stats=stats
+    )
 
-    final_response["Items"] = all_items if all_items else "-"
 
-    return final_response
+def extract_invoice_data_per_page(document_pages, mode=None, stats=None):
+    """Kész OCR szöveg feldolgozása; az összefésült (utófeldolgozás előtti) számlát adja vissza."""
+    page_results = dict(iter_page_results(document_pages, mode=mode, stats=stats))
+    return merge_responses([page_results[page_num] for page_num in sorted(page_results)])
 
 
 # Webszerver indítása
@@ -0,0 +1,294 @@
+"""Aszinkron (ASGI) kiszolgálás az /upload_pdf végponthoz.
+
+A Document AI és az OpenAI hívásokra az eseményhurok vár, nem egy-egy
+szál, így egyetlen worker folyamat több száz folyamatban lévő feltöltést is
+kiszolgálhat. A helyi PDF feldolgozás (hash, szövegréteg, oldalak
+szétválogatása) szálban fut. A gyorsítótárak, a kvóták, a circuit breaker és
+a metrikák ugyanazok, mint a Flask alkalmazásban.
+
+Indítás: gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import os
+import time
+import asyncio
+
+import grpc
+from openai import AsyncOpenAI
+from google.api_core.client_options import ClientOptions
+from google.cloud import documentai  # type: ignore
+from google.cloud.documentai_v1.services.document_processor_service.transports import (  # type: ignore
+    DocumentProcessorServiceGrpcAsyncIOTransport,
+)
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app import (
+    EXTRACTION_MODE, EXTRACTION_MODES, HTTP_REQUEST_SECONDS, LLM_COMPLETION_TOKENS_ESTIMATE, LLM_REQUESTS, LOCATION,
+    MIME_TYPE, PROCESSOR_ID, PROJECT_ID, STAGE_SECONDS, STREAM_FORMATS, DocumentPages, ExtractionStats, api_key,
+    cache_stats_data, cached_page_data, complete_invoice, document_page_texts, documentai_scheduler, estimate_tokens,
+    extraction_headers, finalize_invoice, format_stream_event, invoice_completion_kwargs, lookup_invoice,
+    ocr_page_texts, ocr_request_parts, openai_scheduler, page_data_steps, page_group_steps, plan_document_pages,
+    requested_stream_format, store_page_data,
+)
+from documentai_client import create_gcp_credentials_file, documentai_endpoint
+from metrics import CONTENT_TYPE, REGISTRY
+
+async_client = AsyncOpenAI(api_key=api_key, max_retries=0)
+
+# Itt egy várakozó kérés csak egy coroutine, ezért a korlátok a szálkészleteknél jóval nagyobbak lehetnek;
+# a tényleges kvótát az ütemezők (OPENAI_RPM, OPENAI_TPM, DOCUMENTAI_RPM) tartják
+ASYNC_LLM_MAX_CONCURRENCY = int(os.getenv("ASYNC_LLM_MAX_CONCURRENCY", "64"))
+ASYNC_OCR_MAX_CONCURRENCY = int(os.getenv("ASYNC_OCR_MAX_CONCURRENCY", "16"))
+llm_semaphore = asyncio.Semaphore(ASYNC_LLM_MAX_CONCURRENCY)
+ocr_semaphore = asyncio.Semaphore(ASYNC_OCR_MAX_CONCURRENCY)
+
+# Az aszinkron gRPC csatorna az eseményhurokhoz kötődik, ezért a kliens az első kérésnél jön létre
+_documentai_clients = {}
+
+def get_documentai_client(location: str):
+    """Az adott régióhoz tartozó, megosztott aszinkron Document AI kliens."""
+    api_endpoint = documentai_endpoint(location)
+    key = (location, api_endpoint)
+    client = _documentai_clients.get(key)
+    if client is None:
+        if os.getenv("DOCUMENTAI_INSECURE") == "1":
+            transport = DocumentProcessorServiceGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(api_endpoint))
+            client = documentai.DocumentProcessorServiceAsyncClient(transport=transport)
+        else:
+            create_gcp_credentials_file()
+            opts = ClientOptions(api_endpoint=api_endpoint)
+            client = documentai.DocumentProcessorServiceAsyncClient(client_options=opts)
+        _documentai_clients[key] = client
+    return client
+
+async def process_document_content(pdf_content: bytes) -> list:
+    """Memóriában lévő PDF tartalom feldolgozása oldalanként Google Document AI segítségével."""
+    client = get_documentai_client(LOCATION)
+    name = client.processor_path(PROJECT_ID, LOCATION, PROCESSOR_ID)
+    raw_document = documentai.RawDocument(content=pdf_content, mime_type=MIME_TYPE)
+    request = documentai.ProcessRequest(name=name, raw_document=raw_document)
+    result = await documentai_scheduler.acall(lambda: client.process_document(request=request, retry=None))
+    return document_page_texts(result.document)
+
+async def ocr_pages(load_content, page_nums=None):
+    """OCR Document AI-jal; (oldalindex, szöveg) párokat ad vissza.
+
+    A darab PDF-je csak az OCR hely megszerzése után készül el (szálban), és a
+    túl nagy darab ugyanúgy több kérésre bomlik, mint az app.ocr_pages-ben.
+    """
+    page_texts = []
+    async with ocr_semaphore:
+        with STAGE_SECONDS.time(stage="ocr"):
+            parts = ocr_request_parts(load_content, page_nums)
+            while (part := await asyncio.to_thread(next, parts, None)) is not None:
+                pdf_content, part_page_nums = part
+                texts = await process_document_content(pdf_content)
+                page_texts += ocr_page_texts(texts, part_page_nums)
+    return page_texts
+
+async def request_invoice_completion(content, stats=None, schema=None):
+    """Egy OpenAI chat completion kérés; a válasz szövegét adja vissza."""
+    started = time.monotonic()
+    try:
+        async with llm_semaphore:
+            with STAGE_SECONDS.time(stage="llm"):
+                response = await openai_scheduler.acall(
+                    lambda: async_client.chat.completions.create(**invoice_completion_kwargs(content, schema)),
+                    tokens=estimate_tokens(content) + LLM_COMPLETION_TOKENS_ESTIMATE,
+                )
+    except Exception:
+        LLM_REQUESTS.inc(outcome="error")
+        raise
+    LLM_REQUESTS.inc(outcome="ok")
+    if stats is not None:
+        stats.record_call(response, time.monotonic() - started)
+    return response.choices[0].message.content
+
+async def run_completion_steps(steps, stats=None):
+    """Kinyerési lépések (app.page_data_steps) végrehajtása aszinkron OpenAI hívásokkal; az eredményt adja."""
+    response_text, error = None, None
+    while True:
+        try:
+            content, schema = steps.throw(error) if error is not None else steps.send(response_text)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            response_text, error = await request_invoice_completion(content, stats, schema), None
+        except Exception as e:
+            response_text, error = None, e
+
+async def extract_page_data_cached(page_num, page_text, page_count, stats=None):
+    """Oldal feldolgozása, ha a szöveg már szerepelt korábban, a gyorsítótárból.
+
+    A gyorsítótár és a sablonok SQLite-ot használnak, ezért szálban futnak, nem az eseményhurkon.
+    """
+    page_result = await asyncio.to_thread(cached_page_data, page_num, page_text, page_count, stats)
+    if page_result is None:
+        page_result = await run_completion_steps(page_data_steps(page_num, page_text, page_count, stats), stats)
+        await asyncio.to_thread(store_page_data, page_text, page_result)
+    return page_result
+
+async def extract_page_group_data(group, document_pages, page_count, stats=None):
+    """Több oldal feldolgozása egyetlen OpenAI kéréssel; oldalszám -> eredmény szótárat ad vissza."""
+    if len(group) == 1:
+        page_num = group[0]
+        return {page_num: await extract_page_data_cached(page_num, document_pages[page_num], page_count, stats)}
+
+    page_results = await run_completion_steps(page_group_steps(group, document_pages, page_count, stats), stats)
+    if page_results is None:
+        results = await asyncio.gather(*(
+            extract_page_data_cached(page_num, document_pages[page_num], page_count, stats) for page_num in group
+        ))
+        page_results = dict(zip(group, results))
+    return page_results
+
+async def iter_page_pipeline(page_texts, ready_pages, ocr_chunks, page_count=None, mode=None, stats=None):
+    """OCR és OpenAI kinyerés futószalagon, mint az app.iter_page_pipeline, szálak helyett taszkokkal."""
+    mode = mode or EXTRACTION_MODE
+    pages = DocumentPages(page_texts)
+    ocr_tasks = {asyncio.ensure_future(ocr_pages(load_content, page_nums)) for load_content, page_nums in ocr_chunks}
+    pending = set(ocr_tasks)
+
+    async def submit_pages(batch):
+        ready, groups = await asyncio.to_thread(pages.schedule, batch, mode, page_count, stats)
+        for group in groups:
+            pending.add(asyncio.ensure_future(extract_page_group_data(group, page_texts, page_count, stats)))
+        return ready
+
+    try:
+        for item in await submit_pages(ready_pages):
+            yield item
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if task in ocr_tasks:
+                    for item in await submit_pages(task.result()):
+                        yield item
+                    continue
+                for first_page, page_result in task.result().items():
+                    for item in pages.resolve(first_page, page_result):
+                        yield item
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def iter_invoice_events(pdf_source, mode=None, stats=None):
+    """Egy PDF számla feldolgozása eseményekként, mint az app.iter_invoice_events.
+
+    A hash, a gyorsítótárak és az összefésülés szálban fut, az eseményhurok csak a hálózatra vár.
+    """
+    mode = mode or EXTRACTION_MODE
+    result_key, ocr_key, invoice_data, document_pages = await asyncio.to_thread(lookup_invoice, pdf_source, mode)
+    if invoice_data is not None:
+        yield "result", await asyncio.to_thread(finalize_invoice, invoice_data)
+        return
+
+    if document_pages is not None:
+        page_count, ready_pages, ocr_chunks = len(document_pages), list(enumerate(document_pages)), []
+    else:
+        page_count, ready_pages, ocr_chunks = await asyncio.to_thread(plan_document_pages, pdf_source)
+    yield "pages", {"page_count": page_count}
+
+    stats = stats if stats is not None else ExtractionStats(mode)
+    page_texts = {}
+    page_results = {}
+    async for page_num, page_result in iter_page_pipeline(
+        page_texts, ready_pages, ocr_chunks, page_count=page_count, mode=mode, stats=stats
+    ):
+        page_results[page_num] = page_result
+        yield "page", {"page": page_num + 1, **page_result}
+
+    yield "result", await asyncio.to_thread(
+        complete_invoice, page_results, page_texts, document_pages, result_key, ocr_key, stats
+    )
+
+async def process_invoice_file(pdf_source, mode=None, stats=None):
+    """Egy PDF számla teljes feldolgozása; az összefésült számla adatokat adja vissza."""
+    async for event, data in iter_invoice_events(pdf_source, mode=mode, stats=stats):
+        if event == "result":
+            return data
+
+async def upload_pdf(request):
+    with STAGE_SECONDS.time(stage="save"):
+        form = await request.form()
+    close_form = BackgroundTask(form.close)
+    pdf_file = form.get('file')
+    if pdf_file is None or isinstance(pdf_file, str):
+        return JSONResponse({"error": "No file part in the request"}, status_code=400, background=close_form)
+    if pdf_file.filename == '':
+        return JSONResponse({"error": "No selected file"}, status_code=400, background=close_form)
+
+    mode = request.query_params.get('mode') or EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        return JSONResponse({"error": f"Unknown extraction mode: {mode}"}, status_code=400, background=close_form)
+
+    stream_format = requested_stream_format(request.query_params.get('stream'), request.headers.get('Accept', ''))
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return JSONResponse(
+            {"error": f"Unknown stream format: {stream_format}"}, status_code=400, background=close_form
+        )
+
+    stats = ExtractionStats(mode)
+    if stream_format is not None:
+        return StreamingResponse(
+            stream_invoice_events(pdf_file.file, mode, stats, stream_format),
+            media_type=STREAM_FORMATS[stream_format],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=close_form,
+        )
+
+    try:
+        invoice_data = await process_invoice_file(pdf_file.file, mode=mode, stats=stats)
+    except Exception as e:
+        print(f"Extraction failed: {e}")
+        return JSONResponse(
+            {"error": "An error occurred while processing the invoice data."}, status_code=500, background=close_form
+        )
+    return JSONResponse(invoice_data, headers=extraction_headers(stats), background=close_form)
+
+async def stream_invoice_events(pdf_source, mode, stats, stream_format):
+    """A feldolgozás eseményeinek streamelése, mint az app.stream_invoice_events."""
+    yield format_stream_event("started", {"mode": mode}, stream_format)
+    try:
+        async for event, data in iter_invoice_events(pdf_source, mode=mode, stats=stats):
+            if event == "result":
+                yield format_stream_event("stats", stats.as_dict(), stream_format)
+            yield format_stream_event(event, data, stream_format)
+    except Exception as e:
+        print(f"Streaming extraction failed: {e}")
+        yield format_stream_event(
+            "error", {"error": "An error occurred while processing the invoice data."}, stream_format
+        )
+
+async def cache_stats(request):
+    return JSONResponse(cache_stats_data())
+
+async def metrics(request):
+    """Metrikák Prometheus szöveges formátumban (a kiszolgáló worker folyamatra vonatkozóan)."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+async def observe_request_time(request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    endpoint = request.scope.get("endpoint")
+    if endpoint is not metrics:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=getattr(endpoint, "__name__", "unknown"),
+            status=str(response.status_code),
+        )
+    return response
+
+app = Starlette(
+    routes=[
+        Route('/upload_pdf', upload_pdf, methods=['POST']),
+        Route('/cache/stats', cache_stats, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(BaseHTTPMiddleware, dispatch=observe_request_time)],
+)
@@ -0,0 +1,167 @@
+"""Számlák tömeges feldolgozása parancssorból, a webszerver megkerülésével.
+
+Példák:
+    python backfill.py /data/invoices/2024 --output results.ndjson
+    python backfill.py "/data/**/*.pdf" --executor process --workers 4 --output results.ndjson
+
+A fájlokat a kinyerési futószalag (szövegréteg, Document AI OCR, oldalankénti
+OpenAI kinyerés, összefésülés) dolgozza fel, mint a /upload_pdf végpontot.
+A haladás egy helyi SQLite manifestbe kerül: a megszakított futás
+újraindításkor kihagyja a már kész (és azóta nem módosult) fájlokat, így
+nem költ újra API hívásokat. Az eredmények soronként egy JSON objektumként
+({"filename", "result"} vagy {"filename", "error"}) az output fájl végére kerülnek.
+A fájlok bejárása lusta, egyszerre legfeljebb néhány fájl van feldolgozás
+alatt, így a memóriahasználat a fájlok számától független.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import sqlite3
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from app import process_invoice_file
+
+
+class Manifest:
+    """A feldolgozott fájlok állapota SQLite fájlban (útvonal, méret, módosítási idő, állapot)."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+            "mtime REAL NOT NULL, status TEXT NOT NULL, error TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def is_done(self, path, size, mtime):
+        row = self.conn.execute(
+            "SELECT 1 FROM files WHERE path = ? AND size = ? AND mtime = ? AND status = 'done'", (path, size, mtime)
+        ).fetchone()
+        return row is not None
+
+    def mark(self, path, size, mtime, status, error=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime, status, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, size, mtime, status, error, time.time()),
+        )
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+def iter_pdf_paths(inputs):
+    """A bemenetek (fájl, könyvtár vagy glob minta) PDF fájljai, lustán bejárva."""
+    for source in inputs:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(root, name)
+        elif os.path.isfile(source):
+            yield source
+        else:
+            for path in glob.iglob(source, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(".pdf"):
+                    yield path
+
+
+def process_file(path):
+    """Egy fájl feldolgozása (a munkafolyamatban vagy -szálban); (útvonal, eredmény vagy None, hiba vagy None)."""
+    try:
+        return path, process_invoice_file(path), None
+    except Exception as e:
+        print(f"Backfill of {path} failed: {e}")
+        return path, None, str(e) or type(e).__name__
+
+
+def run_backfill(args):
+    manifest = Manifest(args.manifest)
+    if args.executor == "process":
+        # Új (spawn) folyamatok: forknál a munkafolyamatok a szülő SQLite kapcsolatait (gyorsítótár,
+        # szállítói sablonok), szálkészleteit és gRPC csatornáit örökölnék
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+    # Csak ennyi fájl lehet egyszerre beküldve, hogy a bejárás ne fusson előre
+    max_in_flight = args.workers * 2
+    processed = skipped = failed = 0
+    started = time.monotonic()
+
+    with open(args.output, "a", encoding="utf-8") as out, executor:
+        pending = {}
+
+        def collect(done):
+            nonlocal processed, failed
+            for future in done:
+                path, size, mtime = pending.pop(future)
+                _, result, error = future.result()
+                line = {"filename": path, "result": result} if error is None else {"filename": path, "error": error}
+                # Előbb az eredmény, utána a manifest: megszakításkor legfeljebb egy sor ismétlődhet
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                out.flush()
+                manifest.mark(path, size, mtime, "done" if error is None else "failed", error)
+                processed += 1
+                failed += error is not None
+                if processed % args.log_every == 0:
+                    elapsed = time.monotonic() - started
+                    print(f"Backfill: {processed} processed ({failed} failed), {skipped} skipped, "
+                          f"{processed / elapsed:.2f} files/s", file=sys.stderr)
+
+        try:
+            for path in iter_pdf_paths(args.inputs):
+                path = os.path.abspath(path)
+                stat = os.stat(path)
+                if manifest.is_done(path, stat.st_size, stat.st_mtime):
+                    skipped += 1
+                    continue
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(process_file, path)] = (path, stat.st_size, stat.st_mtime)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        except KeyboardInterrupt:
+            # A még el nem indult fájlok a következő futásra maradnak
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            manifest.close()
+
+    return {
+        "processed": processed,
+        "failed": failed,
+        "skipped": skipped,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract invoices from local PDF files into JSON lines.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories (walked recursively) or glob patterns")
+    parser.add_argument("--output", "-o", required=True, help="JSON lines file; results are appended")
+    parser.add_argument("--manifest", help="progress database for resuming (default: <output>.manifest.sqlite3)")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    parser.add_argument(
+        "--workers", type=int, default=4,
+        help="files processed concurrently; with --executor process the rate limits apply per process",
+    )
+    parser.add_argument("--log-every", type=int, default=100, help="print progress after this many files")
+    args = parser.parse_args()
+    args.manifest = args.manifest or f"{args.output}.manifest.sqlite3"
+
+    summary = run_backfill(args)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Offline benchmark és terheléses teszt a számla-feldolgozó alkalmazásokhoz.
+
+Helyi Document AI (gRPC) és OpenAI-kompatibilis (HTTP) csonkokkal fut, így
+valódi API hívások (és költség) nélkül mérhető az áteresztőképesség és a
+késleltetés. Belépési pont: python -m bench.run --help
+"""
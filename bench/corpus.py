@@ -0,0 +1,136 @@
+"""Szintetikus PDF számlák előállítása a benchmarkhoz.
+
+A digitális oldalak Helvetica szövegréteget kapnak, a "szkennelt" oldalak
+üresek (nincs szövegréteg), így ezek a Document AI csonkhoz kerülnek.
+"""
+import os
+import random
+import argparse
+
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def invoice_page_lines(invoice_no, page_num, page_count, rng):
+    """Egy szintetikus számlaoldal szövegsorai."""
+    lines = []
+    if page_num == 0:
+        lines += [
+            f"INVOICE No. BENCH-{invoice_no:05d}",
+            "Invoice date: 2024.05.12.",
+            f"PO Number: PO-{rng.randint(1000, 9999)}",
+            "Seller: Benchmark Supplier Kft., 1111 Budapest, Fo utca 1.",
+            "Seller tax no.: 12345678-2-41",
+            "Buyer: Example Buyer Zrt., 6720 Szeged, Kossuth ter 2.",
+            "Buyer tax no.: 87654321-2-06",
+            "",
+            "Description              Qty  Unit  Unit price   Amount",
+        ]
+    for item in range(rng.randint(5, 15)):
+        quantity = rng.randint(1, 20)
+        price = rng.randint(100, 50000)
+        lines.append(
+            f"Item {page_num + 1}-{item + 1} service fee   {quantity}  db  {price:,}.00 Ft  {quantity * price:,}.00 Ft"
+        )
+    if page_num == page_count - 1:
+        lines += ["", "VAT 27%", "Subtotal: 100,000.00 Ft", "Total: 127,000.00 Ft", "Shipping: 0.00 Ft"]
+    else:
+        lines.append(f"Carried forward to page {page_num + 2}")
+    return lines
+
+
+def build_pdf(pages, min_size=0, seed=0):
+    """Minimális PDF összeállítása; a pages elemei szövegsor-listák vagy None (szöveg nélküli oldal).
+
+    min_size esetén egy hivatkozatlan, tömöríthetetlen adatfolyam (mint egy beágyazott
+    kép) tölti fel a fájlt legalább ekkora méretre.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # a Pages objektum a végén töltődik ki
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for lines in pages:
+        if lines:
+            commands = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+            commands += [f"({_escape_pdf_text(line)}) Tj T*" for line in lines]
+            commands.append("ET")
+            stream = "\n".join(commands).encode("latin-1", "replace")
+        else:
+            stream = b""
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_refs)
+    if min_size:
+        padding = max(0, min_size - len(_serialize_pdf(objects)) - 64)
+        filler = random.Random(seed).randbytes(padding)
+        objects.append(b"<< /Length %d >>\nstream\n" % padding + filler + b"\nendstream")
+    return _serialize_pdf(objects)
+
+
+def _serialize_pdf(objects):
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+def synthetic_invoice(invoice_no, page_count, scanned=False, seed=None, min_size=0):
+    """Egy szintetikus számla PDF tartalma; min_size esetén legalább ekkora méretre feltöltve."""
+    rng = random.Random(seed if seed is not None else invoice_no)
+    pages = []
+    for page_num in range(page_count):
+        lines = invoice_page_lines(invoice_no, page_num, page_count, rng)
+        pages.append(None if scanned else lines)
+    return build_pdf(pages, min_size=min_size, seed=invoice_no)
+
+
+def build_corpus(count, page_counts=(1, 3, 10), scanned_ratio=0.5, seed=42, min_size=0):
+    """(név, PDF tartalom) párok listája vegyes oldalszámmal és szkennelt/digitális aránnyal."""
+    rng = random.Random(seed)
+    corpus = []
+    for invoice_no in range(count):
+        page_count = page_counts[invoice_no % len(page_counts)]
+        scanned = rng.random() < scanned_ratio
+        kind = "scanned" if scanned else "digital"
+        corpus.append((
+            f"invoice_{invoice_no:05d}_{page_count}p_{kind}.pdf",
+            synthetic_invoice(invoice_no, page_count, scanned=scanned, seed=seed + invoice_no, min_size=min_size),
+        ))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic PDF invoice corpus to a directory.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--pages", default="1,3,10", help="comma-separated page counts to cycle through")
+    parser.add_argument("--scanned-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    page_counts = tuple(int(p) for p in args.pages.split(","))
+    for name, content in build_corpus(args.count, page_counts, args.scanned_ratio, args.seed):
+        with open(os.path.join(args.out_dir, name), "wb") as f:
+            f.write(content)
+    print(f"Wrote {args.count} PDFs to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
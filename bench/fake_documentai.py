@@ -0,0 +1,110 @@
+"""Helyi Document AI gRPC csonk (DocumentProcessorService.ProcessDocument).
+
+A valódi OCR helyett a PDF szövegrétegét adja vissza, szövegréteg nélküli
+oldalra pedig szintetikus számlaszöveget. A késleltetés oldalszámfüggő, a
+hibák UNAVAILABLE / RESOURCE_EXHAUSTED státusszal érkeznek.
+"""
+import io
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+from google.cloud import documentai  # type: ignore
+from PyPDF2 import PdfReader
+
+SERVICE_NAME = "google.cloud.documentai.v1.DocumentProcessorService"
+
+
+def synthetic_page_text(page_num):
+    return (
+        f"INVOICE page {page_num + 1}\n"
+        "Seller: Benchmark Supplier Kft. Tax no.: 12345678-2-41\n"
+        f"Item {page_num + 1}-1 service fee 2 db 1,000.00 Ft 2,000.00 Ft\n"
+        "Total: 2,540.00 Ft\n"
+    )
+
+
+class FakeDocumentAIServer:
+    """gRPC szerver, amely a Document AI online feldolgozását utánozza."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, page_latency=0.1, error_rate=0.0,
+                 max_workers=64, seed=None):
+        self.latency = latency
+        self.page_latency = page_latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.pages = 0
+        self.injected_errors = 0
+
+        handler = grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "ProcessDocument": grpc.unary_unary_rpc_method_handler(
+                self.process_document,
+                request_deserializer=documentai.ProcessRequest.deserialize,
+                response_serializer=documentai.ProcessResponse.serialize,
+            ),
+        })
+        self.server = grpc.server(
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fake-documentai"),
+            options=[("grpc.max_receive_message_length", 64 * 1024 * 1024)],
+        )
+        self.server.add_generic_rpc_handlers((handler,))
+        self.port = self.server.add_insecure_port(f"{host}:{port}")
+        self.host = host
+
+    @property
+    def endpoint(self):
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop(grace=None)
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "pages": self.pages, "injected_errors": self.injected_errors}
+
+    def process_document(self, request, context):
+        with self.lock:
+            self.requests += 1
+            inject_error = self.random.random() < self.error_rate
+        if inject_error:
+            with self.lock:
+                self.injected_errors += 1
+            code = self.random.choice((grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.RESOURCE_EXHAUSTED))
+            context.abort(code, "Injected error")
+
+        try:
+            reader = PdfReader(io.BytesIO(request.raw_document.content))
+            page_texts = [
+                (page.extract_text() or "").strip() or synthetic_page_text(page_num)
+                for page_num, page in enumerate(reader.pages)
+            ]
+        except Exception:
+            page_texts = [synthetic_page_text(0)]
+
+        with self.lock:
+            self.pages += len(page_texts)
+        time.sleep(self.latency + self.page_latency * len(page_texts))
+
+        # A szöveg a dokumentum szintjén van, az oldalak text_anchor szegmensekkel hivatkoznak rá
+        document_text = ""
+        pages = []
+        for page_num, text in enumerate(page_texts):
+            start = len(document_text)
+            document_text += text + "\n"
+            pages.append(documentai.Document.Page(
+                page_number=page_num + 1,
+                layout=documentai.Document.Page.Layout(
+                    text_anchor=documentai.Document.TextAnchor(text_segments=[
+                        documentai.Document.TextAnchor.TextSegment(start_index=start, end_index=len(document_text)),
+                    ]),
+                ),
+            ))
+        return documentai.ProcessResponse(document=documentai.Document(text=document_text, pages=pages))
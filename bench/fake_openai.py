@@ -0,0 +1,184 @@
+"""OpenAI-kompatibilis chat completions csonk állítható késleltetéssel és hibaaránnyal.
+
+A válasz a kérésben kapott JSON sémának (response_format) megfelelő
+szintetikus számla; séma nélküli kérésre ```json keretezett szöveget ad.
+"""
+import re
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_MARKER = re.compile(r"=== Page (\d+) ===")
+
+
+def sample_from_schema(schema, pages):
+    """Szintetikus érték előállítása a JSON séma alapján."""
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: sample_from_schema(prop, pages) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        # Tételenként egy sor oldalanként; oldaljelölt sémánál az oldalszám is benne van
+        items = []
+        for page in pages:
+            item = sample_from_schema(schema["items"], [page])
+            if "page" in item:
+                item["page"] = page
+            items.append(item)
+        return items
+    if kind == "integer":
+        return pages[0] if pages else 1
+    return "-"
+
+
+DEFAULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Invoice Date": {"type": "string"},
+        "Seller Company Name": {"type": "string"},
+        "Items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {name: {"type": "string"} for name in ("description", "quantity", "unit", "price", "amount")},
+            },
+        },
+    },
+}
+
+
+class FakeOpenAIServer:
+    """Szálanként kiszolgáló HTTP csonk a /v1/chat/completions végponthoz."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, jitter=0.1, error_rate=0.0,
+                 per_token_latency=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.per_token_latency = per_token_latency
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.forced_errors = []
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.injected_errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def inject_errors(self, statuses):
+        """A következő kérések a megadott státuszkódokkal (pl. [429] * 5) hibáznak, sorban."""
+        with self.lock:
+            self.forced_errors.extend(statuses)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "injected_errors": self.injected_errors,
+                "max_in_flight": self.max_in_flight,
+            }
+
+    def completion(self, body):
+        """Szintetikus chat completion válasz a kérés alapján."""
+        content = "".join(
+            message.get("content") or "" for message in body.get("messages", []) if message.get("role") == "user"
+        )
+        pages = [int(page) for page in PAGE_MARKER.findall(content)] or [1]
+
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            reply = json.dumps(sample_from_schema(response_format["json_schema"]["schema"], pages))
+        else:
+            reply = "```json\n" + json.dumps(sample_from_schema(DEFAULT_SCHEMA, pages)) + "\n```"
+
+        prompt_tokens = len(content) // 4 + 1
+        completion_tokens = len(reply) // 4 + 1
+        return {
+            "id": f"chatcmpl-bench-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+
+                with server.lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    forced_status = server.forced_errors.pop(0) if server.forced_errors else None
+                    inject_error = forced_status is not None or server.random.random() < server.error_rate
+                    delay = server.latency + server.random.uniform(0, server.jitter)
+                try:
+                    if inject_error:
+                        with server.lock:
+                            server.injected_errors += 1
+                            status = forced_status or server.random.choice((429, 503))
+                        self._send_json(
+                            status,
+                            {"error": {"message": "Injected error", "type": "bench", "code": status}},
+                            {"Retry-After": str(server.retry_after)} if status == 429 else None,
+                        )
+                        return
+
+                    response = server.completion(body)
+                    delay += server.per_token_latency * response["usage"]["completion_tokens"]
+                    time.sleep(delay)
+                    self._send_json(200, response)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+        return Handler
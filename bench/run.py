@@ -0,0 +1,483 @@
+"""Terheléses benchmark: a valódi Flask alkalmazás gunicorn alatt, helyi csonkokkal.
+
+Példák:
+    python -m bench.run --target app --requests 100 --concurrency 16
+    python -m bench.run --target app2 --llm-latency 1.5 --ocr-error-rate 0.05
+    python -m bench.run --target asgi --workers 1 --requests 400 --concurrency 300
+    python -m bench.run --mode packed --pages 10,20 --scanned-ratio 1 --json bench_output.txt
+    python -m bench.run --env LLM_MAX_CONCURRENCY=8 --env OCR_CHUNK_PAGES=2
+    python -m bench.run --scenario concurrency --llm-latency 0.5 --pages 12
+    python -m bench.run --scenario cold_warm --target app2 --requests 10
+    python -m bench.run --scenario spool --requests 20 --concurrency 4
+    python -m bench.run --scenario overlap --pages 10 --env OCR_CHUNK_PAGES=2
+    python -m bench.run --scenario streaming --pages 10 --env OCR_CHUNK_PAGES=2
+
+Eredmény: kérés/másodperc, p50/p95/p99 késleltetés, első bájtig és (NDJSON
+streamelésnél) első kinyert oldalig eltelt idő, hibák száma és a
+workerenkénti maximális memóriahasználat (RSS). A --scenario több futtatást
+végez (pl. különböző korlátokkal), és ezek összesítését adja.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.corpus import build_corpus
+from bench.fake_openai import FakeOpenAIServer
+from bench.fake_documentai import FakeDocumentAIServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Célalkalmazások: (munkakönyvtár, gunicorn alkalmazás, alapértelmezett worker osztály)
+TARGETS = {
+    "app": (ROOT_DIR, "app:app", "gthread"),
+    "asgi": (ROOT_DIR, "asgi:app", "uvicorn.workers.UvicornWorker"),
+    "app2": (os.path.join(ROOT_DIR, "s"), "app2:app", "gthread"),
+    "app3": (os.path.join(ROOT_DIR, "s"), "app3:app", "gthread"),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def child_pids(parent_pid):
+    """A folyamat közvetlen gyermekei (/proc alapján, Linuxon)."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler:
+    """A gunicorn workerek memóriájának periodikus mintavételezése (worker PID -> max RSS)."""
+
+    def __init__(self, master_pid, interval=0.2):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.max_rss = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in child_pids(self.master_pid):
+                self.max_rss[pid] = max(self.max_rss.get(pid, 0), rss_bytes(pid))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def encode_multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def post_invoice(url, filename, content, timeout):
+    """Egy feltöltés; (sikeres?, késleltetés, első bájtig eltelt idő, első "page" eseményig eltelt idő).
+
+    Az utolsó érték csak NDJSON streamelt válasznál (?stream=ndjson) van kitöltve: a
+    "started" esemény azonnal kimegy, így az első bájt nem mutatja, mikor érkezik az
+    első kinyert oldal. Streamelt válaszban az "error" esemény sikertelen kérésnek számít.
+    """
+    body, content_type = encode_multipart("file", filename, content)
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    started = time.perf_counter()
+    first_byte = first_page = None
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            ok = resp.status == 200
+            if resp.headers.get_content_type() != "application/x-ndjson":
+                resp.read(1)
+                first_byte = time.perf_counter() - started
+                resp.read()
+            else:
+                for line in resp:
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    event = json.loads(line).get("event")
+                    if event == "page" and first_page is None:
+                        first_page = time.perf_counter() - started
+                    elif event == "error":
+                        ok = False
+    except (urllib.error.URLError, OSError, ValueError):
+        return False, time.perf_counter() - started, None, None
+    return ok, time.perf_counter() - started, first_byte, first_page
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def worker_class(args):
+    return args.worker_class or TARGETS[args.target][2]
+
+
+def start_app_server(args, port, openai_server, documentai_server, work_dir):
+    cwd, app_spec, _ = TARGETS[args.target]
+    env = dict(os.environ)
+    env.update({
+        "ASSISTANT_KEY": "bench",
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "DOCUMENTAI_ENDPOINT": documentai_server.endpoint,
+        "DOCUMENTAI_INSECURE": "1",
+        "EXTRACTION_MODE": args.mode,
+        "JOB_DB_PATH": os.path.join(work_dir, "jobs.sqlite3"),
+        "JOB_DIR": os.path.join(work_dir, "jobs"),
+        "PAGE_CACHE_PATH": os.path.join(work_dir, "pages.sqlite3"),
+        "RESULT_CACHE_PATH": os.path.join(work_dir, "results.sqlite3"),
+        "VENDOR_TEMPLATE_DB_PATH": os.path.join(work_dir, "vendor_templates.sqlite3"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")])),
+    })
+    if not args.cache:
+        # Ismétlődő korpusz esetén a gyorsítótár mindent elnyelne
+        env["RESULT_CACHE_BACKEND"] = "none"
+        env["PAGE_CACHE_BACKEND"] = "none"
+        env["VENDOR_TEMPLATES"] = "0"
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--workers", str(args.workers),
+        "--threads", str(args.threads),
+        "--worker-class", worker_class(args),
+        "--bind", f"127.0.0.1:{port}",
+        "--timeout", "600",
+        "--log-level", "warning",
+        app_spec,
+    ]
+    output = None if args.verbose else subprocess.DEVNULL
+    return subprocess.Popen(command, cwd=cwd, env=env, stdout=output, stderr=output)
+
+
+def run_benchmark(args):
+    page_counts = tuple(int(p) for p in args.pages.split(","))
+    corpus = build_corpus(
+        args.corpus_size, page_counts, args.scanned_ratio, min_size=int(args.pdf_size_mb * 1024 * 1024)
+    )
+
+    openai_server = FakeOpenAIServer(
+        latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate
+    ).start()
+    documentai_server = FakeDocumentAIServer(
+        latency=args.ocr_latency, page_latency=args.ocr_page_latency, error_rate=args.ocr_error_rate
+    ).start()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="invoice_bench_") as work_dir:
+        process = start_app_server(args, port, openai_server, documentai_server, work_dir)
+        try:
+            wait_for_port(port)
+            url = f"http://127.0.0.1:{port}{args.path}"
+
+            # Bemelegítés: minden worker betölti a modulokat és felépíti a klienseket
+            warmup = [post_invoice(url, name, content, args.timeout) for name, content in corpus[:args.workers]]
+
+            sampler = MemorySampler(process.pid).start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                results = list(executor.map(
+                    lambda i: post_invoice(url, *corpus[i % len(corpus)], args.timeout),
+                    range(args.requests),
+                ))
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            openai_server.stop()
+            documentai_server.stop()
+
+    latencies = sorted(latency for ok, latency, _, _ in results if ok)
+    first_bytes = sorted(first_byte for ok, _, first_byte, _ in results if ok and first_byte is not None)
+    first_pages = sorted(first_page for ok, _, _, first_page in results if ok and first_page is not None)
+    worker_rss = sorted(sampler.max_rss.values())
+    return {
+        "target": args.target,
+        "mode": args.mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": worker_class(args),
+        "succeeded": len(latencies),
+        "failed": len(results) - len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency_seconds": {
+            name: round(value, 3) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 50)),
+                ("p95", percentile(latencies, 95)),
+                ("p99", percentile(latencies, 99)),
+                ("max", latencies[-1] if latencies else None),
+            )
+        },
+        "warmup_latency_seconds": [round(latency, 3) for ok, latency, _, _ in warmup if ok],
+        "time_to_first_byte_p50": round(percentile(first_bytes, 50), 3) if first_bytes else None,
+        "time_to_first_page_p50": round(percentile(first_pages, 50), 3) if first_pages else None,
+        "worker_max_rss_mb": [round(rss / (1024 * 1024), 1) for rss in worker_rss],
+        "openai": openai_server.stats(),
+        "documentai": documentai_server.stats(),
+    }
+
+
+def scenario_args(args, **overrides):
+    """A parancssori beállítások másolata a forgatókönyv felülírásaival."""
+    return argparse.Namespace(**{**vars(args), **overrides})
+
+
+def run_summary(report):
+    return {
+        "succeeded": report["succeeded"],
+        "failed": report["failed"],
+        "latency_p50": report["latency_seconds"]["p50"],
+        "latency_max": report["latency_seconds"]["max"],
+    }
+
+
+def concurrency_scenario(args):
+    """A falióra-idő az egyszerre futó OpenAI hívások korlátjának (LLM_MAX_CONCURRENCY) függvényében.
+
+    Egy worker, egyszerre egy többoldalas digitális számla: az oldalankénti hívások
+    a korlát szerint futnak párhuzamosan, így a várható késleltetés nagyjából
+    ceil(oldalszám / korlát) * LLM késleltetés.
+    """
+    page_count = max(int(p) for p in args.pages.split(","))
+    runs = []
+    for limit in (int(value) for value in args.concurrency_limits.split(",")):
+        report = run_benchmark(scenario_args(
+            args, workers=1, concurrency=1, pages=str(page_count), scanned_ratio=0.0, mode="per_page",
+            env=args.env + [f"LLM_MAX_CONCURRENCY={limit}"],
+        ))
+        runs.append({
+            "llm_max_concurrency": limit,
+            "expected_seconds": round(math.ceil(page_count / limit) * args.llm_latency, 3),
+            **run_summary(report),
+            "openai_max_in_flight": report["openai"]["max_in_flight"],
+        })
+    return {"scenario": "concurrency", "target": args.target, "pages": page_count, "runs": runs}
+
+
+def cold_warm_scenario(args):
+    """Az első (hideg) és a későbbi (meleg) kérések késleltetése egy friss workeren.
+
+    A hideg kérés hozza létre a Document AI gRPC csatornát és az OpenAI kapcsolatot;
+    a meleg kérések már a workerben megtartott klienseket használják. Szkennelt,
+    egyoldalas számlák, hogy minden kérés OCR-en is átmenjen; a hideg mintához
+    a szerver cold_warm_rounds alkalommal újraindul.
+    """
+    cold, warm = [], []
+    failed = 0
+    for _ in range(args.cold_warm_rounds):
+        report = run_benchmark(scenario_args(args, workers=1, concurrency=1, pages="1", scanned_ratio=1.0))
+        cold += report["warmup_latency_seconds"]
+        warm.append(report["latency_seconds"]["p50"])
+        failed += report["failed"]
+    return {
+        "scenario": "cold_warm",
+        "target": args.target,
+        "cold_latency_seconds": cold,
+        "warm_latency_p50_seconds": warm,
+        "cold_minus_warm_seconds": round(percentile(sorted(cold), 50) - percentile(sorted(warm), 50), 3),
+        "failed": failed,
+    }
+
+
+def spool_scenario(args):
+    """Késleltetés és worker memória (RSS) a feltöltött PDF-ek méretének függvényében.
+
+    A PDF-ek egy tömöríthetetlen adatfolyammal vannak feltöltve a megadott méretre;
+    a feltöltés UPLOAD_SPOOL_MAX_BYTES fölött lemezre kerül, így a worker memóriája
+    nem nőhet a fájlmérettel arányosan. A korpusz a bench folyamat memóriájában
+    van, ezért legfeljebb 4 dokumentumból áll.
+    """
+    runs = []
+    for size_mb in (float(value) for value in args.spool_sizes_mb.split(",")):
+        report = run_benchmark(scenario_args(args, pdf_size_mb=size_mb, corpus_size=min(args.corpus_size, 4)))
+        runs.append({
+            "pdf_size_mb": size_mb,
+            **run_summary(report),
+            "requests_per_second": report["requests_per_second"],
+            "worker_max_rss_mb": report["worker_max_rss_mb"],
+        })
+    return {"scenario": "spool", "target": args.target, "runs": runs}
+
+
+def overlap_scenario(args):
+    """Az OCR és az LLM hívások átfedése egy többoldalas szkennelt számlán.
+
+    Három futtatás: csak OCR késleltetés, csak LLM késleltetés, majd mindkettő.
+    Ha a már felismert darabok oldalai az OCR alatt mennek az LLM-hez, a teljes
+    késleltetés a max(OCR, LLM)-hez van közel, nem az OCR + LLM összeghez.
+    """
+    page_count = max(int(p) for p in args.pages.split(","))
+    base = dict(workers=1, concurrency=1, pages=str(page_count), scanned_ratio=1.0)
+    latencies = {}
+    failed = 0
+    for name, overrides in (
+        ("ocr_only", dict(llm_latency=0.0, llm_jitter=0.0)),
+        ("llm_only", dict(ocr_latency=0.0, ocr_page_latency=0.0)),
+        ("combined", {}),
+    ):
+        report = run_benchmark(scenario_args(args, **base, **overrides))
+        latencies[name] = report["latency_seconds"]["p50"]
+        failed += report["failed"]
+    if None in latencies.values():
+        return {"scenario": "overlap", "target": args.target, "latency_p50": latencies, "failed": failed}
+    sequential = latencies["ocr_only"] + latencies["llm_only"]
+    overlapped = max(latencies["ocr_only"], latencies["llm_only"])
+    return {
+        "scenario": "overlap",
+        "target": args.target,
+        "pages": page_count,
+        "latency_p50": latencies,
+        "sequential_estimate": round(sequential, 3),
+        "overlapped_estimate": round(overlapped, 3),
+        # 0: semmi átfedés (OCR + LLM), 1: teljes átfedés (max(OCR, LLM))
+        "overlap": round((sequential - latencies["combined"]) / (sequential - overlapped), 3)
+        if sequential > overlapped else None,
+        "failed": failed,
+    }
+
+
+def streaming_scenario(args):
+    """Pufferelt és NDJSON streamelt /upload_pdf válasz összehasonlítása többoldalas szkennelt számlákon.
+
+    Streamelve az első bájt (a "started" esemény) azonnal, az első kinyert oldal
+    ("page" esemény) az első OCR darab és LLM hívás után megérkezik; pufferelve
+    mindkettő a teljes feldolgozás végén.
+    """
+    page_count = max(int(p) for p in args.pages.split(","))
+    stream_path = args.path + ("&" if "?" in args.path else "?") + "stream=ndjson"
+    runs = []
+    for name, path in (("buffered", args.path), ("ndjson", stream_path)):
+        report = run_benchmark(scenario_args(args, path=path, pages=str(page_count), scanned_ratio=1.0))
+        runs.append({
+            "response": name,
+            **run_summary(report),
+            "time_to_first_byte_p50": report["time_to_first_byte_p50"],
+            "time_to_first_page_p50": report["time_to_first_page_p50"],
+        })
+    return {"scenario": "streaming", "target": args.target, "pages": page_count, "runs": runs}
+
+
+SCENARIOS = {
+    "concurrency": concurrency_scenario,
+    "cold_warm": cold_warm_scenario,
+    "spool": spool_scenario,
+    "overlap": overlap_scenario,
+    "streaming": streaming_scenario,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline load test against local Document AI and OpenAI stand-ins.")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="app")
+    parser.add_argument("--path", default="/upload_pdf", help="endpoint to POST invoices to")
+    parser.add_argument("--mode", choices=("per_page", "packed"), default="per_page")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument("--worker-class", help="gunicorn worker class (default depends on the target)")
+    parser.add_argument("--corpus-size", type=int, default=20)
+    parser.add_argument("--pages", default="1,3,10", help="comma-separated page counts of the synthetic corpus")
+    parser.add_argument("--scanned-ratio", type=float, default=0.5, help="share of PDFs without a text layer")
+    parser.add_argument("--pdf-size-mb", type=float, default=0.0, help="pad every PDF to at least this size")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-latency", type=float, default=0.5)
+    parser.add_argument("--ocr-page-latency", type=float, default=0.1)
+    parser.add_argument("--ocr-error-rate", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="keep the result/page caches and vendor templates enabled")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the app server output")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment variable for the app server (repeatable)")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS),
+                        help="run a multi-run scenario instead of one load test")
+    parser.add_argument("--concurrency-limits", default="1,2,4,8",
+                        help="concurrency scenario: comma-separated LLM_MAX_CONCURRENCY values")
+    parser.add_argument("--cold-warm-rounds", type=int, default=3,
+                        help="cold_warm scenario: app server restarts, one cold request each")
+    parser.add_argument("--spool-sizes-mb", default="1,50", help="spool scenario: comma-separated PDF sizes in MB")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    report = SCENARIOS[args.scenario](args) if args.scenario else run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
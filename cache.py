@@ -0,0 +1,200 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheStats:
+    """Találat/hiány számlálók egy gyorsítótárhoz."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class MemoryCache:
+    """Memóriában tartott LRU gyorsítótár méret alapú kiürítéssel és TTL-lel."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # kulcs -> (lejárat, méret, szerializált érték)
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.time():
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self.stats.record(entry is not None)
+        return json.loads(entry[2]) if entry is not None else None
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires_at, size, data)
+            self._size += size
+            # A legrégebben használt elemek eldobása, amíg bele nem férünk a keretbe
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+
+class SQLiteCache:
+    """Lemezen tárolt gyorsítótár SQLite adatbázisban, TTL-lel és méret alapú kiürítéssel.
+
+    Több folyamat (gunicorn worker) is használhatja ugyanazt a fájlt. A lejárt
+    elemek törlése és a max_bytes keret betartása legfeljebb maintenance_interval
+    másodpercenként fut (a set hívásokban): ilyenkor a legrégebben használt elemek
+    törlődnek, amíg az értékek összmérete a keret alá nem kerül. A használat
+    idejét találatkor legfeljebb touch_interval másodpercenként írjuk, hogy a
+    gyakori olvasás ne járjon minden alkalommal írással.
+    """
+
+    def __init__(self, path, ttl=None, table="cache", max_bytes=None, maintenance_interval=60.0,
+                 touch_interval=60.0):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self.max_bytes = max_bytes
+        self.maintenance_interval = maintenance_interval
+        self.touch_interval = touch_interval
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_maintenance = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, "
+                "size INTEGER NOT NULL DEFAULT 0, accessed_at REAL NOT NULL DEFAULT 0)"
+            )
+            self._migrate(conn)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires_at)")
+
+    def _migrate(self, conn):
+        # A korábbi (méret és használati idő nélküli) táblák kiegészítése
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")}
+        for column, definition in (("size", "INTEGER NOT NULL DEFAULT 0"), ("accessed_at", "REAL NOT NULL DEFAULT 0")):
+            if column in columns:
+                continue
+            try:
+                conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {column} {definition}")
+            except sqlite3.OperationalError as e:
+                # Egy másik folyamat közben már hozzáadta
+                if "duplicate column" not in str(e):
+                    raise
+        conn.execute(f"UPDATE {self.table} SET size = length(value) WHERE size = 0")
+
+    def _connect(self):
+        # Szálanként külön kapcsolat, mert az sqlite3 kapcsolat nem osztható meg
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            f"SELECT value, expires_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and row[1] is not None and row[1] < now:
+            with conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            row = None
+        elif row is not None and row[2] < now - self.touch_interval:
+            with conn:
+                conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats.record(row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, size, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data, expires_at, len(data), now),
+            )
+        with self._lock:
+            due = now >= self._next_maintenance
+            if due:
+                self._next_maintenance = now + self.maintenance_interval
+        if due:
+            self.purge()
+
+    def purge(self):
+        """A lejárt elemek törlése, majd a legrégebben használtaké, amíg az összméret a max_bytes alá nem kerül."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+            if self.max_bytes is not None:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM ("
+                    f"SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS kept FROM {self.table}"
+                    ") WHERE kept > ?)",
+                    (self.max_bytes,),
+                )
+
+
+class NullCache:
+    """Kikapcsolt gyorsítótár: soha nem ad találatot."""
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        self.stats.record(False)
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+def create_cache(backend, path=None, max_bytes=None, ttl=None, table="cache"):
+    """Gyorsítótár létrehozása a megadott backend név alapján (memory, sqlite, none)."""
+    if backend == "memory":
+        return MemoryCache(max_bytes=max_bytes or 64 * 1024 * 1024, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path, ttl=ttl, table=table, max_bytes=max_bytes)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {backend}")
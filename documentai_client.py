@@ -0,0 +1,62 @@
+import os
+import threading
+
+from google.api_core.client_options import ClientOptions
+from google.cloud import documentai  # type: ignore
+from google.cloud.documentai_v1.services.document_processor_service.transports import (  # type: ignore
+    DocumentProcessorServiceGrpcTransport,
+)
+import grpc
+
+# GCP hitelesítési fájl létrehozása a környezeti változóból
+_credentials_lock = threading.Lock()
+_credentials_written = False
+
+def create_gcp_credentials_file():
+    """A hitelesítési fájlt folyamatonként csak egyszer írjuk ki."""
+    global _credentials_written
+    with _credentials_lock:
+        if _credentials_written:
+            return
+        credentials_json = os.getenv("GCP_CREDENTIALS")
+        if credentials_json:
+            credentials_path = "/tmp/credentials.json"  # Átmeneti fájl
+            with open(credentials_path, "w") as f:
+                f.write(credentials_json)
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
+            _credentials_written = True
+        else:
+            raise Exception("No GCP credentials found in environment variable.")
+
+# Document AI kliensek (és a mögöttük lévő gRPC csatornák) újrahasznosítása.
+# A kliensek szálbiztosak, ezért egy gunicorn workeren belül minden kérés
+# ugyanazt a példányt használja; a létrehozás lustán, az első kérésnél
+# történik, így fork után minden worker saját csatornát nyit.
+_documentai_clients = {}
+_documentai_clients_lock = threading.Lock()
+
+def get_documentai_client(location: str):
+    """Visszaadja az adott régióhoz tartozó, megosztott Document AI klienst.
+
+    A DOCUMENTAI_ENDPOINT felülírja a végpontot; DOCUMENTAI_INSECURE=1 esetén
+    titkosítatlan csatornán, hitelesítés nélkül csatlakozunk (helyi csonkhoz, benchmarkhoz).
+    """
+    api_endpoint = documentai_endpoint(location)
+    key = (location, api_endpoint)
+    client = _documentai_clients.get(key)
+    if client is None:
+        with _documentai_clients_lock:
+            client = _documentai_clients.get(key)
+            if client is None:
+                if os.getenv("DOCUMENTAI_INSECURE") == "1":
+                    transport = DocumentProcessorServiceGrpcTransport(channel=grpc.insecure_channel(api_endpoint))
+                    client = documentai.DocumentProcessorServiceClient(transport=transport)
+                else:
+                    create_gcp_credentials_file()
+                    opts = ClientOptions(api_endpoint=api_endpoint)
+                    client = documentai.DocumentProcessorServiceClient(client_options=opts)
+                _documentai_clients[key] = client
+    return client
+
+def documentai_endpoint(location: str) -> str:
+    return os.getenv("DOCUMENTAI_ENDPOINT") or f"{location}-documentai.googleapis.com"
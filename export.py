@@ -0,0 +1,229 @@
+"""Kinyert számlák exportálása XLSX, CSV vagy Parquet formátumba, állandó memóriahasználattal.
+
+A számlák (fájlnév, eredmény) párokként, tetszőleges iterátorból érkeznek, és
+chunk_size méretű darabokban kerülnek normalizálásra (postprocess) és kiírásra:
+- XLSX: "Invoices" (számlánként egy sor) és "Items" (tételenként egy sor) munkalap,
+  xlsxwriter constant_memory módban;
+- CSV és Parquet: tételenként egy sor a számla fejlécmezőivel (tétel nélküli
+  számlánál egy üres tételsor); a Parquet sorcsoportonként íródik.
+A Valid és az Issues oszlop a postprocess_invoice ellenőrzéseit tükrözi, a hiányzó
+oldalakat ("Failed pages") is.
+"""
+import io
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+from invoice_schema import INVOICE_FIELDS, ITEM_FIELDS
+from jobs import JobStore
+from postprocess import NUMBER_HEADER_FIELDS, NUMBER_ITEM_FIELDS, validate_invoices, validation_issues
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+INVOICE_COLUMNS = [
+    "File", *INVOICE_FIELDS, "Invoice Date (ISO)", *(f"{field} (number)" for field in NUMBER_HEADER_FIELDS),
+    "Failed pages", "Valid", "Issues",
+]
+ITEM_COLUMNS = ["Line", *ITEM_FIELDS, *(f"{field} (number)" for field in NUMBER_ITEM_FIELDS)]
+
+# Az Excel munkalap legfeljebb ennyi sort tud (a fejléc sorral együtt)
+XLSX_MAX_ROWS = 1_048_576
+
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_frames(records, chunk_size=1000):
+    """(számla DataFrame, tétel DataFrame) darabonként, az export oszlopneveivel."""
+    for chunk in iter_chunks(records, chunk_size):
+        filenames = [filename for filename, _ in chunk]
+        headers, items = validate_invoices([invoice if isinstance(invoice, dict) else {} for _, invoice in chunk])
+
+        # Számlánként a postprocess_invoice által jelzett ellenőrzések neve, vesszővel elválasztva;
+        # a tételszintűek "item_" előtaggal
+        issues = pd.Series([
+            ",".join(dict.fromkeys(("item_" if "item" in issue else "") + issue["check"] for issue in document_issues))
+            for document_issues in validation_issues(headers, items)
+        ], index=headers.index, dtype=object)
+
+        invoices = pd.DataFrame({"File": filenames}, index=headers.index)
+        for field in INVOICE_FIELDS:
+            invoices[field] = headers[field]
+        invoices["Invoice Date (ISO)"] = headers["Invoice Date_value"].dt.date
+        for field in NUMBER_HEADER_FIELDS:
+            invoices[f"{field} (number)"] = headers[f"{field}_value"]
+        invoices["Failed pages"] = headers["Failed pages"].map(lambda pages: ",".join(map(str, pages)))
+        invoices["Valid"] = issues == ""
+        invoices["Issues"] = issues
+
+        item_rows = pd.DataFrame({
+            "document": items["document"],
+            "File": np.asarray(filenames, dtype=object)[items["document"].to_numpy()] if len(items) else [],
+            "Line": items["line"] + 1,
+        })
+        for field in ITEM_FIELDS:
+            item_rows[field] = items[field]
+        for field in NUMBER_ITEM_FIELDS:
+            item_rows[f"{field} (number)"] = items[f"{field}_value"]
+
+        yield invoices, item_rows
+
+
+def flat_frame(invoices, item_rows):
+    """Tételenként egy sor a számla fejlécmezőivel; tétel nélküli számlánál egy üres tételsor."""
+    flat = invoices.rename_axis("document").reset_index().merge(
+        item_rows.drop(columns=["File"]), on="document", how="left"
+    )
+    flat["Line"] = flat["Line"].astype("Int64")
+    return flat[INVOICE_COLUMNS + ITEM_COLUMNS]
+
+
+def _cell_rows(frame):
+    """A DataFrame sorai Python értékekként; a hiányzó értékek None-ok (üres cella)."""
+    values = frame.astype(object).where(frame.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def write_xlsx(records, out, chunk_size=1000):
+    """XLSX export két munkalappal; az out fájlnév vagy írható bináris fájl objektum."""
+    workbook = xlsxwriter.Workbook(out, {"constant_memory": True, "strings_to_numbers": False})
+    bold = workbook.add_format({"bold": True})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+
+    def add_sheet(name, columns):
+        worksheet = workbook.add_worksheet(name)
+        worksheet.write_row(0, 0, columns, bold)
+        if "Invoice Date (ISO)" in columns:
+            index = columns.index("Invoice Date (ISO)")
+            worksheet.set_column(index, index, 12, date_format)
+        return worksheet
+
+    sheets = {"Invoices": [add_sheet("Invoices", INVOICE_COLUMNS), 1, 1]}
+    sheets["Items"] = [add_sheet("Items", ["File"] + ITEM_COLUMNS), 1, 1]
+
+    def write_rows(name, columns, frame):
+        sheet = sheets[name]
+        for row in _cell_rows(frame):
+            if sheet[1] >= XLSX_MAX_ROWS:
+                # Betelt a munkalap: folytatás egy újon ("Items 2", "Items 3", ...)
+                sheet[2] += 1
+                sheet[0] = add_sheet(f"{name} {sheet[2]}", columns)
+                sheet[1] = 1
+            sheet[0].write_row(sheet[1], 0, row)
+            sheet[1] += 1
+
+    for invoices, item_rows in export_frames(records, chunk_size):
+        write_rows("Invoices", INVOICE_COLUMNS, invoices[INVOICE_COLUMNS])
+        write_rows("Items", ["File"] + ITEM_COLUMNS, item_rows[["File"] + ITEM_COLUMNS])
+    workbook.close()
+
+
+def write_csv(records, out, chunk_size=1000):
+    """CSV export (UTF-8 BOM-mal, hogy az Excel is helyesen nyissa meg); az out írható bináris fájl objektum."""
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    first = True
+    for invoices, item_rows in export_frames(records, chunk_size):
+        flat_frame(invoices, item_rows).to_csv(text, header=first, index=False)
+        first = False
+    if first:
+        pd.DataFrame(columns=INVOICE_COLUMNS + ITEM_COLUMNS).to_csv(text, index=False)
+    text.flush()
+    text.detach()
+
+
+PARQUET_SCHEMA = pa.schema(
+    [("File", pa.string())]
+    + [(field, pa.string()) for field in INVOICE_FIELDS]
+    + [("Invoice Date (ISO)", pa.date32())]
+    + [(f"{field} (number)", pa.float64()) for field in NUMBER_HEADER_FIELDS]
+    + [("Failed pages", pa.string()), ("Valid", pa.bool_()), ("Issues", pa.string()), ("Line", pa.int64())]
+    + [(field, pa.string()) for field in ITEM_FIELDS]
+    + [(f"{field} (number)", pa.float64()) for field in NUMBER_ITEM_FIELDS]
+)
+
+
+def write_parquet(records, out, chunk_size=1000):
+    """Parquet export; darabonként egy sorcsoport. Az out fájlnév vagy írható bináris fájl objektum."""
+    with pq.ParquetWriter(out, PARQUET_SCHEMA) as writer:
+        for invoices, item_rows in export_frames(records, chunk_size):
+            flat = flat_frame(invoices, item_rows)
+            writer.write_table(pa.Table.from_pandas(flat, schema=PARQUET_SCHEMA, preserve_index=False))
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_invoices(records, export_format, out, chunk_size=1000):
+    """(fájlnév, számla) párok exportálása a megadott formátumba."""
+    if export_format not in WRITERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    WRITERS[export_format](records, out, chunk_size)
+
+
+def read_records(lines):
+    """(fájlnév, számla) párok NDJSON sorokból: a sor maga a számla, vagy /upload_batch kimeneti sor."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict) or ("error" in record and "result" not in record):
+            # Sikertelen dokumentum (pl. /upload_batch hibasor): nincs mit exportálni
+            continue
+        invoice = record.get("result", record)
+        if isinstance(invoice, dict):
+            yield record.get("filename") or f"#{number}", invoice
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export extracted invoices to XLSX, CSV or Parquet.")
+    parser.add_argument("path", nargs="?", help="NDJSON file (default: stdin, unless --jobs-db is given)")
+    parser.add_argument("--output", "-o", required=True, help="output file")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="default: from the output file extension")
+    parser.add_argument("--jobs-db", help="export finished jobs from this job database instead of NDJSON")
+    parser.add_argument("--since", type=float, help="with --jobs-db: jobs created at or after this Unix time")
+    parser.add_argument("--until", type=float, help="with --jobs-db: jobs created before this Unix time")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    export_format = args.format or args.output.rsplit(".", 1)[-1].lower()
+    if export_format not in EXPORT_FORMATS:
+        parser.error(f"cannot infer the format from {args.output}, use --format")
+
+    if args.jobs_db:
+        store = JobStore(args.jobs_db, os.getenv("JOB_DIR", "/tmp/invoice_jobs"))
+        records = store.iter_results(args.since, args.until)
+        source = None
+    else:
+        source = open(args.path, encoding="utf-8") if args.path else sys.stdin
+        records = read_records(source)
+
+    try:
+        with open(args.output, "wb") as out:
+            export_invoices(records, export_format, out, args.chunk_size)
+    finally:
+        if source is not None and source is not sys.stdin:
+            source.close()
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+
+# A számla fejléc mezői, abban a sorrendben, ahogy a promptban szerepelnek
+INVOICE_FIELDS = [
+    "Invoice Date",
+    "PO Number",
+    "Seller Company Name",
+    "Seller Company Address",
+    "Seller Tax No.",
+    "Buyer Company Name",
+    "Buyer Company Address",
+    "Buyer Tax No.",
+    "VAT percent",
+    "Subtotal excluded VAT",
+    "Total included VAT",
+    "Shipping Cost",
+]
+
+# A tételsorok mezői
+ITEM_FIELDS = ["description", "quantity", "unit", "price", "amount"]
+
+
+def invoice_json_schema(page_tagged=False):
+    """A kanonikus számla JSON séma (OpenAI strict structured output kompatibilis).
+
+    page_tagged=True esetén minden tétel egy 'page' mezőt is kap (csomagolt mód).
+    """
+    item_properties = {field: {"type": "string"} for field in ITEM_FIELDS}
+    if page_tagged:
+        item_properties["page"] = {"type": "integer"}
+
+    properties = {field: {"type": "string"} for field in INVOICE_FIELDS}
+    properties["Items"] = {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": item_properties,
+            "required": list(item_properties),
+            "additionalProperties": False,
+        },
+    }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+INVOICE_SCHEMA = invoice_json_schema()
+PAGE_TAGGED_INVOICE_SCHEMA = invoice_json_schema(page_tagged=True)
+
+
+def subset_schema(schema, fields):
+    """A séma szűkítése a megadott mezőkre (célzott újrakérdezéshez)."""
+    properties = {field: schema["properties"][field] for field in fields}
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def response_format(schema, name="invoice"):
+    """Az OpenAI chat completions response_format paramétere a sémához."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema},
+    }
+
+
+def _clean_scalar(value):
+    # Számként érkező értékek elfogadása, üres szöveg helyett '-'
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return value.strip() or "-"
+    return None
+
+
+def _clean_items(items, item_schema):
+    if items == "-" or items is None:
+        return []
+    if not isinstance(items, list):
+        return None
+    item_properties = item_schema["properties"]
+    cleaned_items = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        cleaned_item = {}
+        for field, field_schema in item_properties.items():
+            value = item.get(field)
+            if field_schema["type"] == "integer":
+                try:
+                    cleaned_item[field] = int(value)
+                except (TypeError, ValueError):
+                    return None
+            else:
+                value = _clean_scalar(value if value is not None else "-")
+                if value is None:
+                    return None
+                cleaned_item[field] = value
+        cleaned_items.append(cleaned_item)
+    return cleaned_items
+
+
+def parse_invoice(response_text, schema=INVOICE_SCHEMA):
+    """A modell válaszának értelmezése és ellenőrzése a séma alapján.
+
+    Visszatérési érték: (adatok, hibás mezők listája). A hibás mezők nem
+    szerepelnek az adatokban; ezeket célzottan újra lehet kérdezni.
+    """
+    fields = list(schema["properties"])
+    try:
+        data = json.loads(response_text)
+    except (TypeError, ValueError):
+        return {}, fields
+    if not isinstance(data, dict):
+        return {}, fields
+
+    parsed = {}
+    invalid_fields = []
+    for field in fields:
+        field_schema = schema["properties"][field]
+        if field_schema["type"] == "array":
+            value = _clean_items(data.get(field), field_schema["items"])
+        else:
+            value = _clean_scalar(data.get(field))
+        if value is None:
+            invalid_fields.append(field)
+        else:
+            parsed[field] = value
+    return parsed, invalid_fields
+
+
+def missing_value(schema, field):
+    """A hiányzó mező értéke: tételeknél üres lista, egyébként '-'."""
+    return [] if schema["properties"][field]["type"] == "array" else "-"
+
+
+def reask_prompt(fields, page_text, instructions=""):
+    """Az újrakérdezés utasítása: csak a felsorolt mezőket kérjük.
+
+    Az instructions a mezőlista után kerül a promptba (pl. a csomagolt mód oldaljelölése).
+    """
+    field_list = "".join(f"- {field}\n" for field in fields)
+    return (
+        "Here is part of the text of an invoice. Please extract only the following fields "
+        "as structured data (if a field is not present, return '-'):\n"
+        f"{field_list}\n{instructions}Text of the invoice:\n{page_text}"
+    )
+
+
+def parse_reasked_fields(response_text, fields, schema):
+    """Az újrakérdezett mezők értelmezése; ami másodszorra sem jó, az '-' (tételeknél üres lista) lesz."""
+    reasked, still_invalid = parse_invoice(response_text, subset_schema(schema, fields))
+    for field in still_invalid:
+        reasked[field] = missing_value(schema, field)
+    return reasked
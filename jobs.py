@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import ipaddress
+import threading
+import urllib.parse
+import urllib.request
+
+CALLBACK_SCHEMES = ("http", "https")
+
+
+def check_callback_url(callback_url, allowed_hosts=None):
+    """A callback URL ellenőrzése; ValueError, ha nem http(s), vagy a host nem megengedett.
+
+    Az allowed_hosts elemei pontos hostnevek, a ponttal kezdődők (".example.com")
+    az aldomaineket is engedik. Üres vagy None esetén a host minden feloldott
+    címének nyilvánosnak kell lennie (nem loopback, link-local, privát, fenntartott
+    vagy multicast), hogy a callback ne érhesse el a belső hálózatot.
+    """
+    parsed = urllib.parse.urlsplit(callback_url)
+    if parsed.scheme not in CALLBACK_SCHEMES or not parsed.hostname:
+        raise ValueError("callback_url must be an absolute http or https URL")
+    host = parsed.hostname.lower()
+    if allowed_hosts:
+        if not any(
+            host == allowed.lstrip(".") or (allowed.startswith(".") and host.endswith(allowed))
+            for allowed in allowed_hosts
+        ):
+            raise ValueError(f"callback_url host is not allowed: {host}")
+        return callback_url
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or None, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"callback_url host cannot be resolved: {host}") from e
+    for address in addresses:
+        if not public_address(address):
+            raise ValueError(f"callback_url host resolves to a non-public address: {host}")
+    return callback_url
+
+
+def public_address(address):
+    """Igaz, ha a cím nyilvános (az IPv6 zónaazonosító és az IPv4-re leképzett cím is kezelve)."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not (
+        ip.is_loopback or ip.is_link_local or ip.is_private or ip.is_reserved or ip.is_multicast
+        or ip.is_unspecified
+    )
+
+
+class JobStore:
+    """Lemezen tárolt feladatsor SQLite adatbázisban.
+
+    A feltöltött fájlok a job_dir könyvtárba kerülnek, a feladatok állapota az
+    adatbázisba. Több folyamat (gunicorn worker) is dolgozhat ugyanabból a sorból.
+    Egy feladat legfeljebb max_attempts alkalommal indul el; ha a bérlete ennyi
+    próbálkozás után is lejár (pl. a feldolgozás újra és újra összeomlasztja a
+    workert), hibásként zárul. A callback URL csak a callback_hosts hostjaira, ezek
+    hiányában csak nyilvános címre mutathat.
+    """
+
+    def __init__(self, path, job_dir, max_attempts=3, callback_hosts=None):
+        self.path = path
+        self.job_dir = job_dir
+        self.max_attempts = max_attempts
+        self.callback_hosts = callback_hosts
+        self._local = threading.local()
+        os.makedirs(job_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, callback_url TEXT, "
+                "pages_done INTEGER NOT NULL DEFAULT 0, pages_total INTEGER, "
+                "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, claimed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        # Szálanként külön kapcsolat, mert az sqlite3 kapcsolat nem osztható meg
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def file_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.pdf")
+
+    def create(self, filename, file_storage, callback_url=None):
+        """Új feladat felvétele; a fájl mentése után azonnal visszatér az azonosítóval.
+
+        ValueError, ha a callback URL nem megengedett.
+        """
+        if callback_url is not None:
+            check_callback_url(callback_url, self.callback_hosts)
+        job_id = uuid.uuid4().hex
+        file_storage.save(self.file_path(job_id))
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, status, filename, callback_url, created_at, updated_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, filename, callback_url, now, now),
+        )
+        return job_id
+
+    def claim(self, lease_seconds):
+        """A legrégebbi várakozó (vagy lejárt bérletű, még újrapróbálható) feladat lefoglalása."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND claimed_at < ? AND attempts < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now - lease_seconds, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', claimed_at = ?, updated_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def abandon_expired(self, lease_seconds):
+        """A max_attempts próbálkozás után is lejárt bérletű feladatok hibásként zárása; a lezárt feladatok."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job_ids = [
+                row["id"] for row in conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'running' AND claimed_at < ? AND attempts >= ?",
+                    (now - lease_seconds, self.max_attempts),
+                )
+            ]
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                [(f"Job abandoned after {self.max_attempts} attempts", now, job_id) for job_id in job_ids],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for job_id in job_ids:
+            self._remove_file(job_id)
+        return [self.get(job_id) for job_id in job_ids]
+
+    def update_progress(self, job_id, pages_done, pages_total):
+        # A haladás frissítése egyben a bérletet is megújítja
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET pages_done = ?, pages_total = ?, updated_at = ?, claimed_at = ? WHERE id = ?",
+            (pages_done, pages_total, now, now, job_id),
+        )
+
+    def finish(self, job_id, result):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', result = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(result), time.time(), job_id),
+        )
+        self._remove_file(job_id)
+
+    def fail(self, job_id, error):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+            (error, time.time(), job_id),
+        )
+        self._remove_file(job_id)
+
+    def get(self, job_id):
+        """A feladat állapota, haladása és (ha kész) eredménye."""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "filename": row["filename"],
+            "callback_url": row["callback_url"],
+            "progress": {"pages_done": row["pages_done"], "pages_total": row["pages_total"]},
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def iter_results(self, since=None, until=None, batch_size=500):
+        """A kész feladatok (fájlnév, eredmény) párjai létrehozási sorrendben, lapozva (exporthoz)."""
+        conn = self._connect()
+        last = (since if since is not None else float("-inf"), "")
+        until = until if until is not None else float("inf")
+        while True:
+            rows = conn.execute(
+                "SELECT id, filename, result, created_at FROM jobs WHERE status = 'done' "
+                "AND (created_at > ? OR (created_at = ? AND id > ?)) AND created_at < ? "
+                "ORDER BY created_at, id LIMIT ?",
+                (last[0], last[0], last[1], until, batch_size),
+            ).fetchall()
+            for row in rows:
+                yield row["filename"], json.loads(row["result"])
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1]["created_at"], rows[-1]["id"])
+
+    def _remove_file(self, job_id):
+        try:
+            os.remove(self.file_path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+class JobWorkerPool:
+    """Helyi szálkészlet, amely a JobStore sorából dolgozza fel a feladatokat."""
+
+    def __init__(self, store, handler, workers=2, poll_interval=1.0, lease_seconds=600):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """A munkaszálak elindítása (folyamatonként egyszer)."""
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True).start()
+            self._started = True
+
+    def notify(self):
+        """Új feladat érkezett: a várakozó munkaszálak felébresztése."""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                for abandoned in self.store.abandon_expired(self.lease_seconds):
+                    print(f"Job {abandoned['id']} failed: {abandoned['error']}")
+                    self._send_callback(abandoned)
+                job = self.store.claim(self.lease_seconds)
+            except Exception as e:
+                print(f"Failed to claim job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        job_id = job["id"]
+
+        def progress(pages_done, pages_total):
+            self.store.update_progress(job_id, pages_done, pages_total)
+
+        try:
+            result = self.handler(self.store.file_path(job_id), progress)
+            self.store.finish(job_id, result)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.fail(job_id, str(e))
+
+        self._send_callback(self.store.get(job_id))
+
+    def _send_callback(self, job):
+        if job["callback_url"]:
+            send_callback(job["callback_url"], job, self.store.callback_hosts)
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Átirányítást nem követünk, hogy a callback ne vezethessen az engedélyezett hostokon kívülre."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+callback_opener = urllib.request.build_opener(NoRedirectHandler)
+
+
+def send_callback(callback_url, job, allowed_hosts=None):
+    """A kész feladat állapotának elküldése a megadott callback URL-re (POST, JSON)."""
+    data = json.dumps(job).encode("utf-8")
+    try:
+        # A korábban felvett feladatok URL-je is a jelenlegi szabályok szerint
+        check_callback_url(callback_url, allowed_hosts)
+        req = urllib.request.Request(
+            callback_url, data=data, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with callback_opener.open(req, timeout=10) as resp:
+            resp.read()
+    except Exception as e:
+        print(f"Callback to {callback_url} failed for job {job['id']}: {e}")
@@ -0,0 +1,210 @@
+"""Oldalankénti kinyerési eredmények összefésülése egy számlává.
+
+- Fejléc: minden mezőt külön választunk; az értékre szavaznak azok az oldalak,
+  amelyek ugyanazt (normalizálva) adták, az oldal szavazata annál erősebb, minél
+  több fejlécmezőt talált. A hibás ({"error": ...}) oldalak és az '-' értékek
+  nem szavaznak. Döntetlennél az összegmezőknél a későbbi, egyébként a korábbi
+  oldal nyer (a végösszeg jellemzően az utolsó oldalon áll).
+- Tételek: egy folytatólagos oldal elején megismételt blokkot (az előző oldal
+  utolsó tételei ugyanabban a sorrendben, a normalizált (leírás, mennyiség,
+  egységár, összeg) kulcs alapján) elhagyjuk; máshol az azonos tételek (pl. két
+  oldalon ugyanaz a termék) megmaradnak.
+- Az áthozott/átvitt részösszeg sorok (mennyiség és egységár nélküli sorok,
+  amelyek leírása csak egy ilyen címke, vagy összegük a futó összeggel egyezik)
+  nem kerülnek a tételek közé.
+- A hibás oldalak sorszáma a "Failed pages" listába kerül, hogy a hiányos
+  eredmény ne tűnjön teljesnek.
+
+Az összefésülés a tételek számában lineáris.
+"""
+import re
+from functools import lru_cache
+
+from invoice_schema import INVOICE_FIELDS
+from postprocess import ABS_TOLERANCE, REL_TOLERANCE
+
+# Az összegek a dokumentum végén állnak; a korábbi oldalakon legfeljebb részösszeg szerepel
+TOTAL_FIELDS = {"Subtotal excluded VAT", "Total included VAT", "Shipping Cost"}
+
+ITEM_KEY_FIELDS = ("description", "quantity", "price", "amount")
+NUMBER_KEY_FIELDS = {"quantity", "price", "amount"}
+
+CARRIED_FORWARD_LABEL = (
+    r"(?:carried|brought|balance)\s+(?:forward|over)|[cb]/[fo]|sub-?\s?total|page\s+total"
+    r"|átvitel|áthozat|részösszeg|oldal\s*összesen|übertrag|zwischensumme"
+)
+# A címke a leírás elején áll, utána legfeljebb számok, írásjelek, oldalhivatkozás vagy pénznem
+# következhet ("Átvitel 2. oldalról:", "Carried forward to page 3"), így a "c/o Kovács Kft." vagy a
+# "Subtotal adjustment fee" nem áthozott sor.
+CARRIED_FORWARD_TAIL = r"[\s\d.,:;()/\-–]*"
+CARRIED_FORWARD_PATTERN = re.compile(
+    rf"^\W*(?:{CARRIED_FORWARD_LABEL})\b{CARRIED_FORWARD_TAIL}"
+    rf"(?:(?:from|to|on|of|page|oldal(?:ról|ra|on)?|von|seite|ft|huf|eur)\b{CARRIED_FORWARD_TAIL})*$",
+    re.IGNORECASE,
+)
+
+
+NON_NUMBER_CHARS = re.compile(r"[^\d,.\-]")
+DECIMAL_SEPARATOR = re.compile(r"[.,](\d{1,2})$")
+GROUP_SEPARATORS = re.compile(r"[.,]")
+TRAILING_MINUS = re.compile(r"^(\d.*)-$")
+
+
+@lru_cache(maxsize=65536)
+def parse_number(value):
+    """Számként írt szöveg float-tá alakítása (a postprocess.parse_numbers szabályaival); None, ha nem szám."""
+    if not isinstance(value, str):
+        return None
+    text = NON_NUMBER_CHARS.sub("", value)
+    text = DECIMAL_SEPARATOR.sub(r"#\1", text)
+    text = GROUP_SEPARATORS.sub("", text).replace("#", ".")
+    text = TRAILING_MINUS.sub(r"-\1", text)
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def present(value):
+    return isinstance(value, str) and value.strip() not in ("", "-")
+
+
+def normalize_value(field, value):
+    if field in NUMBER_KEY_FIELDS or field in TOTAL_FIELDS:
+        number = parse_number(value)
+        if number is not None:
+            return number
+    return " ".join(value.split()).casefold()
+
+
+def item_key(item):
+    return tuple(
+        normalize_value(field, item[field]) if present(item.get(field)) else None for field in ITEM_KEY_FIELDS
+    )
+
+
+def close(a, b):
+    return abs(a - b) <= max(ABS_TOLERANCE, REL_TOLERANCE * max(abs(a), abs(b)))
+
+
+def is_carried_forward(item, running_total, item_count, page_edge):
+    """Áthozott/átvitt részösszeg sor: mennyiség és egységár nélküli sor, amelynek leírása
+    áthozott/átvitt címke, vagy az oldal első/utolsó sora, és az összege az eddigi tételek
+    összegével egyezik."""
+    if present(item.get("quantity")) or present(item.get("price")):
+        return False
+    description = item.get("description")
+    if isinstance(description, str) and CARRIED_FORWARD_PATTERN.match(description.strip()):
+        return True
+    if not page_edge or item_count < 2:
+        return False
+    amount = parse_number(item.get("amount"))
+    return amount is not None and close(amount, running_total)
+
+
+def merge_header(pages):
+    """A fejlécmezők kiválasztása a legerősebb oldalszavazatok alapján."""
+    weights = [
+        sum(1 for field in INVOICE_FIELDS if present(page.get(field))) / len(INVOICE_FIELDS) for page in pages
+    ]
+    header = {}
+    for field in INVOICE_FIELDS:
+        # normalizált érték -> [pontszám, első és utolsó oldal, utolsó és első eredeti érték]
+        votes = {}
+        for index, page in enumerate(pages):
+            value = page.get(field)
+            if not present(value):
+                continue
+            vote = votes.setdefault(normalize_value(field, value), [0.0, index, index, value, value])
+            vote[0] += weights[index]
+            vote[2] = index
+            vote[3] = value
+        if not votes:
+            header[field] = "-"
+        elif field in TOTAL_FIELDS:
+            header[field] = max(votes.values(), key=lambda vote: (vote[0], vote[2]))[3]
+        else:
+            header[field] = max(votes.values(), key=lambda vote: (vote[0], -vote[1]))[4]
+
+    # A sémán kívüli mezők (pl. séma nélküli módban) az első olyan oldalról, ahol szerepelnek
+    extra = {}
+    for page in pages:
+        for field, value in page.items():
+            if field != "Items" and field not in header and (field not in extra or not present(extra[field])):
+                extra[field] = value
+    return {**header, **extra}
+
+
+def carried_over_count(previous_keys, page_keys):
+    """Az oldal elején megismételt blokk hossza: a page_keys leghosszabb olyan kezdőszelete,
+    amely a previous_keys végével egyezik (prefixfüggvénnyel, lineáris időben)."""
+    if not page_keys or not previous_keys:
+        return 0
+    # Az elválasztó semmivel sem egyenlő, így az egyezés nem nyúlhat át rajta
+    sequence = page_keys + [object()] + previous_keys[-len(page_keys):]
+    border = [0] * len(sequence)
+    for index in range(1, len(sequence)):
+        length = border[index - 1]
+        while length and sequence[index] != sequence[length]:
+            length = border[length - 1]
+        if sequence[index] == sequence[length]:
+            length += 1
+        border[index] = length
+    return border[-1]
+
+
+def merge_items(pages):
+    """A tételek összefűzése oldalsorrendben, az áthozott tételblokkok és a részösszeg sorok nélkül."""
+    items = []
+    keys = []  # az items tételkulcsai; a nem szótár tételeké egyedi, semmivel sem egyező érték
+    running_total = 0.0
+    for page in pages:
+        page_items = page.get("Items")
+        if not isinstance(page_items, list):
+            continue
+
+        def page_rows():
+            # Az oldal megmaradó sorai (pozíció, tétel, kulcs); a részösszeg sorok nélkül
+            for position, item in enumerate(page_items):
+                if not isinstance(item, dict):
+                    yield position, item, object()
+                    continue
+                page_edge = position == 0 or position == len(page_items) - 1
+                if not is_carried_forward(item, running_total, len(items), page_edge):
+                    yield position, item, item_key(item)
+
+        # A blokk alatt az items és a running_total nem változik, így a két bejárás ugyanazokat a sorokat adja
+        repeated = carried_over_count(keys, [key for _, _, key in page_rows()])
+        for _, item, key in page_rows():
+            if repeated:
+                # Folytatólagos oldal elején megismételt tétel
+                repeated -= 1
+                continue
+            items.append(item)
+            keys.append(key)
+            amount = key[-1] if isinstance(key, tuple) else None
+            if isinstance(amount, float):
+                running_total += amount
+    return items
+
+
+def merge_responses(responses):
+    """Összefésüli a válaszokat, hogy egy struktúrált JSON-t adjon vissza."""
+    if not responses:
+        return {}
+
+    pages = [response for response in responses if isinstance(response, dict) and "error" not in response]
+    failed_pages = [
+        page_num for page_num, response in enumerate(responses, 1)
+        if not isinstance(response, dict) or "error" in response
+    ]
+    if not pages:
+        # Minden oldal hibás: az első hiba marad az eredmény
+        return {**responses[0], "Items": "-", "Failed pages": failed_pages}
+
+    invoice = merge_header(pages)
+    items = merge_items(pages)
+    invoice["Items"] = items if items else "-"
+    if failed_pages:
+        invoice["Failed pages"] = failed_pages
+    return invoice
@@ -0,0 +1,240 @@
+import time
+import random
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """Token bucket: percenkénti kerettel, legfeljebb egy percnyi löketig."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, amount):
+        """Levonja a mennyiséget, ha rendelkezésre áll (0-t ad); különben a szükséges várakozási időt adja."""
+        # Egy percnyi keretnél nagyobb kérés is átmehet, csak a teljes keretet várja ki
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount=1):
+        """Blokkol, amíg a kért mennyiség rendelkezésre nem áll."""
+        while True:
+            wait = self._take(amount)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, amount=1):
+        """Mint az acquire, de az eseményhurkot nem blokkolja."""
+        while True:
+            wait = self._take(amount)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class CircuitOpenError(Exception):
+    """A szolgáltató megszakítója nyitva van, és az újrapróbálási keret alatt sem zárt."""
+
+
+class CircuitBreaker:
+    """Egymás utáni kiesések után egy ideig nem enged hívást a szolgáltató felé.
+
+    Kiesésnek az a hívás számít, amely minden újrapróbálás után is
+    újrapróbálható hibával (5xx, kapcsolati hiba) végződött; a kvótatúllépés
+    (429 / Retry-After) nem, hiszen a szolgáltató válaszolt. A várakozási idő
+    letelte után egyetlen próbahívást enged át (half-open); ha az sikeres, a
+    megszakító újra zár, ha kiesik, újra nyit.
+    """
+
+    # Ennyit vár az a hívás, amely half-open állapotban a próbahívás eredményére vár
+    TRIAL_POLL_INTERVAL = 1.0
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def acquire(self):
+        """Indulhat-e a hívás: (várakozási idő másodpercben, ez-e a próbahívás).
+
+        Zárt megszakítónál (0, False); nyitottnál a half-open állapotig hátralévő
+        idő; half-open állapotban az első hívás lesz a próbahívás (0, True).
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0, False
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining, False
+            if self._trial_in_flight:
+                return min(self.TRIAL_POLL_INTERVAL, self.reset_timeout), False
+            self._trial_in_flight = True
+            return 0.0, True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def cancel_trial(self):
+        """A próbahívás eredmény nélkül ért véget (pl. megszakították): a következő hívás próbálhat."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class OutboundScheduler:
+    """Kimenő hívások ütemezése egy szolgáltató felé.
+
+    - kérés/perc és token/perc token bucket,
+    - exponenciális visszalépés teljes jitterrel, a Retry-After tiszteletben tartásával,
+    - szolgáltatónkénti circuit breaker; nyitott megszakítónál a hívás az
+      újrapróbálási kereten belül kivárja a próbahívást.
+
+    A classify(exc) függvény (újrapróbálható?, Retry-After másodpercben vagy None)
+    párt ad vissza a kivételre. Retry-After-rel érkező hiba kvótatúllépésnek
+    (throttling) számít, amely nem nyitja a megszakítót.
+    """
+
+    def __init__(self, name, classify, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=5, base_delay=0.5, max_delay=30.0, breaker=None):
+        self.name = name
+        self.classify = classify
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Várakozási idő az adott próbálkozás után."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            # A szerver által kért időnél korábban nem próbálkozunk újra
+            delay = max(delay, min(retry_after, self.max_delay * 4))
+        return delay
+
+    def _breaker_delay(self, attempt):
+        """A nyitott megszakító miatti várakozás (0, ha a hívás indulhat); a keret kimerülésekor kivétel."""
+        wait, trial = self.breaker.acquire()
+        if not wait:
+            return 0.0, trial
+        if attempt >= self.max_retries:
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        # Egy várakozás legfeljebb max_delay, így a teljes várakozás is az újrapróbálási kereten belül marad
+        wait = min(wait, self.max_delay)
+        print(f"{self.name} circuit breaker is open, retry {attempt + 1}/{self.max_retries} in {wait:.2f}s")
+        return wait, False
+
+    def _failure_delay(self, exc, attempt, trial):
+        """Sikertelen hívás után: a várakozási idő az újrapróbálásig, vagy None, ha a kivételt tovább kell dobni."""
+        retryable, retry_after = self.classify(exc)
+        if not retryable or retry_after is not None:
+            # A szolgáltató válaszolt (pl. 400 vagy kvótatúllépés), ez nem számít kiesésnek
+            self.breaker.record_success()
+        elif attempt >= self.max_retries or trial:
+            # Kiesés: a hívás minden újrapróbálás után is sikertelen, vagy elbukott a próbahívás
+            self.breaker.record_failure()
+        if not retryable or attempt >= self.max_retries:
+            return None
+        delay = self.backoff_delay(attempt, retry_after)
+        print(f"{self.name} call failed ({exc}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    def call(self, fn, tokens=0):
+        """A fn() hívása a kereteken belül, újrapróbálással."""
+        attempt = 0
+        while True:
+            wait, trial = self._breaker_delay(attempt)
+            if wait:
+                time.sleep(wait)
+                attempt += 1
+                continue
+            if self.request_bucket is not None:
+                self.request_bucket.acquire(1)
+            if self.token_bucket is not None and tokens:
+                self.token_bucket.acquire(tokens)
+
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._failure_delay(e, attempt, trial)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                if trial:
+                    self.breaker.cancel_trial()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn, tokens=0):
+        """Mint a call, de a fn() egy coroutine-t ad vissza; a várakozások nem blokkolnak.
+
+        A kvóta és a circuit breaker közös a szinkron hívásokkal.
+        """
+        attempt = 0
+        while True:
+            wait, trial = self._breaker_delay(attempt)
+            if wait:
+                await asyncio.sleep(wait)
+                attempt += 1
+                continue
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire_async(1)
+            if self.token_bucket is not None and tokens:
+                await self.token_bucket.acquire_async(tokens)
+
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._failure_delay(e, attempt, trial)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Pl. a taszk megszakítása (CancelledError)
+                if trial:
+                    self.breaker.cancel_trial()
+                raise
+
+            self.breaker.record_success()
+            return result
@@ -1,11 +1,18 @@
 import os
+import sys
 import json
 from flask import Flask, request, jsonify
-from google.api_core.client_options import ClientOptions
 from google.cloud import documentai  # type: ignore
 import openai
 from openai import OpenAI
 
+# A kanonikus számla séma és a Document AI kliens a projekt gyökerében van, minden belépési pont ezt használja
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from documentai_client import get_documentai_client  # noqa: E402
+from invoice_schema import (  # noqa: E402
+    INVOICE_SCHEMA, parse_invoice, parse_reasked_fields, reask_prompt, response_format, subset_schema,
+)
+
 
 # Flask alkalmazás létrehozása
 app = Flask(__name__)
@@ -14,99 +21,38 @@ app = Flask(__name__)
 api_key = os.getenv("ASSISTANT_KEY")  # vagy használd: api_key = 'your_api_key'
 client = OpenAI(api_key=api_key)
 
+# A teljes OCR szöveg és a modell válaszának naplózása csak hibakereséshez; egyébként csak a méretük
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0") == "1"
 
 
 
-# GCP hitelesítési fájl létrehozása a környezeti változóból
-def create_gcp_credentials_file():
-    credentials_json = os.getenv("GCP_CREDENTIALS")
-    if credentials_json:
-        credentials_path = "/tmp/credentials.json"  # Átmeneti fájl
-        with open(credentials_path, "w") as f:
-            f.write(credentials_json)
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-    else:
-        raise Exception("No GCP credentials found in environment variable.")
-
-def parse_response_to_json(response_text):
-    # Számla adatainak feldolgozása
-    invoice_data = {
-        "Invoice Date": "",
-        "PO Number": "",
-        "Seller Company Name": "",
-        "Seller Company Address": "",
-        "Seller Tax No.": "",
-        "Buyer Company Name": "",
-        "Buyer Company Address": "",
-        "Buyer Tax No.": "",
-        "Items": [],
-        "VAT percent": "",
-        "Subtotal excluded VAT": "",
-        "Total included VAT": "",
-        "Shipping Cost": ""
-    }
-
-    # Az API válasz soronkénti feldolgozása
-    lines = response_text.split("\n")
-    current_item = {}
-    for line in lines:
-        line = line.strip()
-        if ": " in line:
-            key_value = line.split(": ", 1)
-            if len(key_value) == 2:
-                key, value = key_value
-                # Tisztítsuk meg az extra idézőjeleket és fehér karaktereket
-                value = value.strip().strip("\"").strip(",")
-                if "Invoice Date" in key:
-                    invoice_data["Invoice Date"] = value
-                elif "PO Number" in key:
-                    invoice_data["PO Number"] = value
-                elif "Seller Company Name" in key:
-                    invoice_data["Seller Company Name"] = value
-                elif "Seller Company Address" in key:
-                    invoice_data["Seller Company Address"] = value
-                elif "Seller Tax No." in key:
-                    invoice_data["Seller Tax No."] = value
-                elif "Buyer Company Name" in key:
-                    invoice_data["Buyer Company Name"] = value
-                elif "Buyer Company Address" in key:
-                    invoice_data["Buyer Company Address"] = value
-                elif "Buyer Tax No." in key:
-                    invoice_data["Buyer Tax No."] = value
-                elif "Description" in key:
-                    if current_item:
-                        invoice_data["Items"].append(current_item)
-                    current_item = {"description": value}
-                elif "Quantity" in key:
-                    current_item["quantity"] = value
-                elif "Unit" in key:
-                    current_item["unit"] = value    
-                elif "Price" in key:
-                    current_item["price"] = value
-                elif "Amount" in key:
-                    current_item["amount"] = value
-                elif "VAT percent" in key:
-                    invoice_data["VAT percent"] = value
-                elif "Subtotal excluded VAT" in key:
-                    invoice_data["Subtotal excluded VAT"] = value
-                elif "Total included VAT" in key:
-                    invoice_data["Total included VAT"] = value
-                elif "Shipping Cost" in key:
-                    invoice_data["Shipping Cost"] = value
-    
-    # Az utolsó tétel hozzáadása az Items listához
-    if current_item:
-        invoice_data["Items"].append(current_item)
+
+def parse_response_to_json(response_text, document_text):
+    """Számla adatainak feldolgozása a kanonikus séma alapján."""
+    invoice_data, invalid_fields = parse_invoice(response_text, INVOICE_SCHEMA)
+
+    # A hibás vagy hiányzó mezőket célzottan újrakérdezzük; ami másodszorra sem jó, az '-' (tételeknél üres lista)
+    if invalid_fields:
+        invoice_data.update(reask_invoice_fields(invalid_fields, document_text))
 
     return invoice_data
 
+def reask_invoice_fields(fields, document_text):
+    """Csak a megadott mezők újrakérdezése a szűkített sémával."""
+    print(f"Re-asking malformed fields: {fields}")
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        response_format=response_format(subset_schema(INVOICE_SCHEMA, fields)),
+        messages=[
+            {"role": "system", "content": "You are an AI that extracts invoice data."},
+            {"role": "user", "content": reask_prompt(fields, document_text)},
+        ],
+    )
+    return parse_reasked_fields(response.choices[0].message.content, fields, INVOICE_SCHEMA)
+
 def process_document_sample(project_id: str, location: str, processor_id: str, file_path: str, mime_type: str) -> str:
-    # Hitelesítési fájl létrehozása
-    create_gcp_credentials_file()
-    
-    # Google Document AI feldolgozás
-    opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
-    client = documentai.DocumentProcessorServiceClient(client_options=opts)
+    # Google Document AI feldolgozás (megosztott kliens)
+    client = get_documentai_client(location)
 
     name = client.processor_path(project_id, location, processor_id)
 
@@ -152,8 +98,11 @@ def upload_pdf():
     # OCR futtatása a Google Document AI segítségével
     document_text = process_document_sample(project_id, location, processor_id, file_path, mime_type)
 
-    # Logoljuk a kinyert OCR szöveget
-    print("Google Document AI extracted text:", document_text)
+    # Logoljuk a kinyert OCR szöveget (alapból csak a hosszát)
+    if LOG_PAYLOADS:
+        print("Google Document AI extracted text:", document_text)
+    else:
+        print(f"Google Document AI extracted text: {len(document_text)} characters")
 
     # Az átmenetileg mentett fájl törlése
     os.remove(file_path)
@@ -166,12 +115,14 @@ def upload_pdf():
 
 def extract_invoice_data(document_text):
     # Logoljuk a szöveget, amit az OpenAI-nak küldünk
-    print("Text being sent to OpenAI:", document_text)
+    if LOG_PAYLOADS:
+        print("Text being sent to OpenAI:", document_text)
     
     try:
         # OpenAI API meghívása a számla adatok felismeréséhez
         response = client.chat.completions.create(
             model="gpt-4o-mini",  # vagy gpt-3.5-turbo
+            response_format=response_format(INVOICE_SCHEMA),
             messages=[
                 {
                     "role": "system",
@@ -207,10 +158,13 @@ def extract_invoice_data(document_text):
 
         # Logoljuk ki a teljes OpenAI választ
         response_text = (response.choices[0].message.content)
-        print("Full OpenAI response:", response_text)
+        if LOG_PAYLOADS:
+            print("Full OpenAI response:", response_text)
+        else:
+            print(f"OpenAI response: {len(response_text or '')} characters")
 
         # A válasz feldolgozása és JSON formátumra alakítása
-        invoice_data = parse_response_to_json(response_text)
+        invoice_data = parse_response_to_json(response_text, document_text)
         return invoice_data
 
     except Exception as e:
@@ -1,11 +1,18 @@
 import os
+import sys
 import json
 from flask import Flask, request, jsonify
-from google.api_core.client_options import ClientOptions
 from google.cloud import documentai  # type: ignore
 import openai  # Itt az OpenAI modul helyes használata
 from openai import OpenAI
 
+# A kanonikus számla séma és a Document AI kliens a projekt gyökerében van, minden belépési pont ezt használja
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from documentai_client import get_documentai_client  # noqa: E402
+from invoice_schema import (  # noqa: E402
+    INVOICE_SCHEMA, parse_invoice, parse_reasked_fields, reask_prompt, response_format, subset_schema,
+)
+
 # Flask alkalmazás létrehozása
 app = Flask(__name__)
 
@@ -14,24 +21,12 @@ api_key = os.getenv("ASSISTANT_KEY")
 openai.api_key = api_key  # Beállítjuk az OpenAI API kulcsot
 client = OpenAI(api_key=api_key)
 
-# GCP hitelesítési fájl létrehozása a környezeti változóból
-def create_gcp_credentials_file():
-    credentials_json = os.getenv("GCP_CREDENTIALS")
-    if credentials_json:
-        credentials_path = "/tmp/credentials.json"  # Átmeneti fájl
-        with open(credentials_path, "w") as f:
-            f.write(credentials_json)
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-    else:
-        raise Exception("No GCP credentials found in environment variable.")
+# A teljes OCR szöveg és a modell válaszának naplózása csak hibakereséshez; egyébként csak a méretük
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0") == "1"
 
 def process_document_sample(project_id: str, location: str, processor_id: str, file_path: str, mime_type: str) -> str:
-    # Hitelesítési fájl létrehozása
-    create_gcp_credentials_file()
-    
-    # Google Document AI feldolgozás
-    opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
-    client = documentai.DocumentProcessorServiceClient(client_options=opts)
+    # Google Document AI feldolgozás (megosztott kliens)
+    client = get_documentai_client(location)
 
     name = client.processor_path(project_id, location, processor_id)
 
@@ -77,8 +72,11 @@ def upload_pdf():
     # OCR futtatása a Google Document AI segítségével
     document_text = process_document_sample(project_id, location, processor_id, file_path, mime_type)
 
-    # Logoljuk a kinyert OCR szöveget
-    print("Google Document AI extracted text:", document_text)
+    # Logoljuk a kinyert OCR szöveget (alapból csak a hosszát)
+    if LOG_PAYLOADS:
+        print("Google Document AI extracted text:", document_text)
+    else:
+        print(f"Google Document AI extracted text: {len(document_text)} characters")
 
     # Az átmenetileg mentett fájl törlése
     os.remove(file_path)
@@ -91,12 +89,14 @@ def upload_pdf():
 
 def extract_invoice_data(document_text):
     # Logoljuk a szöveget, amit az OpenAI-nak küldünk
-    print("Text being sent to OpenAI:", document_text)
+    if LOG_PAYLOADS:
+        print("Text being sent to OpenAI:", document_text)
     
     try:
         # OpenAI API meghívása a számla adatok felismeréséhez
         response = client.chat.completions.create(  # Az openai modult közvetlenül használjuk
             model="gpt-4o-mini",  # vagy gpt-3.5-turbo
+            response_format=response_format(INVOICE_SCHEMA),
             messages=[
                 {
                     "role": "system",
@@ -132,10 +132,17 @@ def extract_invoice_data(document_text):
 
         # Logoljuk ki a teljes OpenAI választ
         response_text = (response.choices[0].message.content)
-        print("Full OpenAI response:", response_text)
-
-        # Az OpenAI válasz visszaküldése közvetlenül, feldolgozás nélkül
-        return response_text  # Közvetlenül visszaküldjük a választ
+        if LOG_PAYLOADS:
+            print("Full OpenAI response:", response_text)
+        else:
+            print(f"OpenAI response: {len(response_text or '')} characters")
+
+        # A séma szerinti válasz ellenőrzése; a hibás mezőket célzottan újrakérdezzük,
+        # ami másodszorra sem jó, az '-' (tételeknél üres lista) lesz
+        invoice_data, invalid_fields = parse_invoice(response_text, INVOICE_SCHEMA)
+        if invalid_fields:
+            invoice_data.update(reask_invoice_fields(invalid_fields, document_text))
+        return invoice_data
 
     except Exception as e:
         # Logoljuk ki a hibát, ha valami rosszul megy
@@ -143,6 +150,20 @@ def extract_invoice_data(document_text):
         return jsonify({"error": "An error occurred while processing the invoice data."}), 500
 
 
+def reask_invoice_fields(fields, document_text):
+    """Csak a megadott mezők újrakérdezése a szűkített sémával."""
+    print(f"Re-asking malformed fields: {fields}")
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        response_format=response_format(subset_schema(INVOICE_SCHEMA, fields)),
+        messages=[
+            {"role": "system", "content": "You are an AI that extracts invoice data."},
+            {"role": "user", "content": reask_prompt(fields, document_text)},
+        ],
+    )
+    return parse_reasked_fields(response.choices[0].message.content, fields, INVOICE_SCHEMA)
+
+
 # Webszerver indítása
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,30 @@
+"""Közös tesztkörnyezet: helyi OpenAI és Document AI csonkok, átmeneti adatbázisok.
+
+A környezeti változókat az app importálása előtt kell beállítani, ezért ez a
+modul betöltésekor történik.
+"""
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from bench.fake_openai import FakeOpenAIServer  # noqa: E402
+from bench.fake_documentai import FakeDocumentAIServer  # noqa: E402
+
+WORK_DIR = tempfile.mkdtemp(prefix="invoice_tests_")
+openai_server = FakeOpenAIServer(latency=0.01, jitter=0.0).start()
+documentai_server = FakeDocumentAIServer(latency=0.01, page_latency=0.0).start()
+
+os.environ.update({
+    "ASSISTANT_KEY": "test",
+    "OPENAI_BASE_URL": openai_server.base_url,
+    "DOCUMENTAI_ENDPOINT": documentai_server.endpoint,
+    "DOCUMENTAI_INSECURE": "1",
+    "JOB_DB_PATH": os.path.join(WORK_DIR, "jobs.sqlite3"),
+    "JOB_DIR": os.path.join(WORK_DIR, "jobs"),
+    "PAGE_CACHE_BACKEND": "none",
+    "RESULT_CACHE_BACKEND": "none",
+    "VENDOR_TEMPLATES": "0",
+})
@@ -0,0 +1,33 @@
+import argparse
+import json
+
+import pytest
+
+from backfill import run_backfill
+from bench.corpus import synthetic_invoice
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_backfill_resumes(tmp_path, monkeypatch, executor):
+    # A spawn munkafolyamatok importáláskor olvassák a környezetet: ott SQLite gyorsítótárakkal fut
+    monkeypatch.setenv("PAGE_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("PAGE_CACHE_PATH", str(tmp_path / "pages.sqlite3"))
+    monkeypatch.setenv("VENDOR_TEMPLATES", "1")
+    monkeypatch.setenv("VENDOR_TEMPLATE_DB_PATH", str(tmp_path / "templates.sqlite3"))
+    inputs = tmp_path / "invoices"
+    inputs.mkdir()
+    for number in range(3):
+        (inputs / f"{number}.pdf").write_bytes(synthetic_invoice(number, 2, number == 1))
+    output = tmp_path / "results.ndjson"
+    args = argparse.Namespace(
+        inputs=[str(inputs)], output=str(output), manifest=str(tmp_path / "manifest.sqlite3"),
+        executor=executor, workers=2, log_every=100,
+    )
+
+    first = run_backfill(args)
+    second = run_backfill(args)
+
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert (first["processed"], first["failed"]) == (3, 0)
+    assert (second["processed"], second["skipped"]) == (0, 3)
+    assert all("result" in line for line in lines)
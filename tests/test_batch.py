@@ -0,0 +1,54 @@
+import io
+import json
+import zipfile
+
+from werkzeug.datastructures import FileStorage
+
+import app
+from bench.corpus import synthetic_invoice
+
+
+def zip_of(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_zip_members_are_not_extracted_up_front():
+    archive = zip_of({f"{number}.pdf": synthetic_invoice(number, 1, False) for number in range(3)})
+    documents, spooled = app.spool_batch_uploads([FileStorage(io.BytesIO(archive), filename="batch.zip")])
+    try:
+        # Csak az archívum másolata és a ZipFile nyílt meg, egyetlen tag sem csomagolódott ki
+        assert len(spooled) == 2
+        assert [filename for filename, _, _ in documents] == ["0.pdf", "1.pdf", "2.pdf"]
+        with documents[1][1]() as pdf_stream:
+            assert pdf_stream.read() == synthetic_invoice(1, 1, False)
+    finally:
+        for spooled_file in spooled:
+            spooled_file.close()
+
+
+def test_batch_reports_oversized_zip_member(monkeypatch):
+    small = synthetic_invoice(1, 1, False)
+    large = synthetic_invoice(2, 3, False)
+    monkeypatch.setattr(app, "BATCH_MEMBER_MAX_BYTES", len(small))
+    archive = zip_of({"small.pdf": small, "large.pdf": large, "notes.txt": b"skip"})
+
+    response = app.app.test_client().post("/upload_batch", data={
+        "files": [(io.BytesIO(archive), "batch.zip"), (io.BytesIO(large), "plain.pdf")],
+    })
+
+    assert response.status_code == 200
+    lines = {line["filename"]: line for line in map(json.loads, response.get_data(as_text=True).splitlines())}
+    assert set(lines) == {"small.pdf", "large.pdf", "plain.pdf"}
+    assert "result" in lines["small.pdf"]
+    assert "result" in lines["plain.pdf"]
+    assert "limit" in lines["large.pdf"]["error"]
+
+
+def test_invalid_zip():
+    response = app.app.test_client().post("/upload_batch", data={"files": [(io.BytesIO(b"not a zip"), "batch.zip")]})
+
+    assert response.status_code == 400
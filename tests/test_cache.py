@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from cache import SQLiteCache, create_cache
+
+
+def stored_keys(cache):
+    return {row[0] for row in cache._connect().execute(f"SELECT key FROM {cache.table}")}
+
+
+def test_sqlite_cache_evicts_least_recently_used_beyond_max_bytes(tmp_path):
+    value = "x" * 100
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_bytes=350, maintenance_interval=0, touch_interval=0)
+    for key in ("a", "b", "c"):
+        cache.set(key, value)
+        time.sleep(0.01)
+    assert cache.get("a") == value
+
+    cache.set("d", value)
+
+    assert stored_keys(cache) == {"a", "c", "d"}
+
+
+def test_sqlite_cache_purges_expired_rows_without_reading_them(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=1, maintenance_interval=0)
+    cache.set("old", 1)
+    time.sleep(1.1)
+
+    cache.set("new", 2)
+
+    assert stored_keys(cache) == {"new"}
+
+
+def test_sqlite_cache_skips_values_larger_than_max_bytes(tmp_path):
+    cache = create_cache("sqlite", path=str(tmp_path / "cache.sqlite3"), max_bytes=10)
+    cache.set("big", "x" * 100)
+
+    assert cache.get("big") is None
+
+
+def test_sqlite_cache_upgrades_existing_table(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE pages (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.execute("INSERT INTO pages VALUES ('old', '\"value\"', NULL)")
+
+    cache = SQLiteCache(path, table="pages", max_bytes=1000, maintenance_interval=0)
+    cache.set("new", "value")
+
+    assert cache.get("old") == "value"
+    size = cache._connect().execute("SELECT size FROM pages WHERE key = 'old'").fetchone()[0]
+    assert size == len('"value"')
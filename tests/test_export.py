@@ -0,0 +1,46 @@
+import io
+
+import pandas as pd
+import pytest
+
+from export import export_invoices
+
+ITEM = {"description": "Widget", "quantity": "2", "unit": "db", "price": "10,00", "amount": "20,00"}
+CLEAN = {
+    "Invoice Date": "2024. május 12.", "VAT percent": "27", "Subtotal excluded VAT": "20,00",
+    "Total included VAT": "25,40", "Shipping Cost": "-", "Items": [ITEM],
+}
+RECORDS = [
+    ("clean.pdf", CLEAN),
+    ("partial.pdf", {**CLEAN, "Failed pages": [2, 4]}),
+    ("mismatch.pdf", {**CLEAN, "Items": [{**ITEM, "amount": "30,00"}]}),
+]
+EXPECTED = {
+    "clean.pdf": (True, "", ""),
+    "partial.pdf": (False, "failed_pages", "2,4"),
+    "mismatch.pdf": (False, "item_amount_mismatch,items_subtotal_mismatch", ""),
+}
+
+
+def exported_invoices(export_format):
+    out = io.BytesIO()
+    export_invoices(iter(RECORDS), export_format, out)
+    out.seek(0)
+    if export_format == "xlsx":
+        pytest.importorskip("openpyxl")
+        return pd.read_excel(out, sheet_name="Invoices", dtype={"Failed pages": str})
+    if export_format == "csv":
+        frame = pd.read_csv(out, encoding="utf-8-sig", dtype={"Failed pages": str, "Issues": str})
+    else:
+        frame = pd.read_parquet(out)
+    return frame.drop_duplicates("File")
+
+
+@pytest.mark.parametrize("export_format", ["xlsx", "csv", "parquet"])
+def test_valid_issues_and_failed_pages_columns(export_format):
+    frame = exported_invoices(export_format).fillna({"Issues": "", "Failed pages": ""})
+
+    actual = {
+        row["File"]: (bool(row["Valid"]), row["Issues"], row["Failed pages"]) for _, row in frame.iterrows()
+    }
+    assert actual == EXPECTED
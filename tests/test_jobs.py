@@ -0,0 +1,113 @@
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import jobs
+from jobs import JobStore, check_callback_url
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "jobs"), max_attempts=2,
+                    callback_hosts=["hooks.example.com", ".partner.example"])
+
+
+def upload():
+    return FileStorage(io.BytesIO(b"%PDF-1.4"), filename="invoice.pdf")
+
+
+@pytest.mark.parametrize("url", [
+    "https://hooks.example.com/invoices",
+    "http://hooks.example.com:8080/cb",
+    "https://erp.partner.example/cb",
+])
+def test_allowed_callback_urls(url):
+    assert check_callback_url(url, ["hooks.example.com", ".partner.example"]) == url
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "gopher://hooks.example.com/",
+    "/relative/path",
+    "https://evil.example.com/cb",
+    "https://hooks.example.com.evil.net/cb",
+    "http://169.254.169.254/latest/meta-data",
+])
+def test_rejected_callback_urls(url):
+    with pytest.raises(ValueError):
+        check_callback_url(url, ["hooks.example.com", ".partner.example"])
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost:9000/cb",
+    "http://127.0.0.1/cb",
+    "http://[::1]/cb",
+    "http://0.0.0.0/cb",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::ffff:169.254.169.254]/latest/meta-data",
+    "http://10.0.0.5/cb",
+    "http://192.168.1.10/cb",
+    "http://224.0.0.1/cb",
+    "ftp://93.184.216.34/cb",
+])
+def test_non_public_callback_urls_rejected_without_allowlist(url):
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+
+def test_public_address_allowed_without_allowlist():
+    assert check_callback_url("https://93.184.216.34/cb")
+
+
+def test_send_callback_rechecks_the_url(monkeypatch):
+    opened = []
+    monkeypatch.setattr(jobs.callback_opener, "open", lambda *args, **kwargs: opened.append(args))
+
+    jobs.send_callback("http://169.254.169.254/latest/meta-data", {"id": "job"})
+
+    assert opened == []
+
+
+def test_create_rejects_disallowed_callback(store):
+    with pytest.raises(ValueError):
+        store.create("invoice.pdf", upload(), "https://evil.example.com/cb")
+
+
+def test_job_fails_after_max_attempts(store):
+    job_id = store.create("invoice.pdf", upload(), "https://hooks.example.com/cb")
+
+    # Negatív bérletidő: minden lefoglalt feladat bérlete azonnal lejárt
+    assert store.claim(lease_seconds=-1)["id"] == job_id
+    assert store.abandon_expired(lease_seconds=-1) == []
+    assert store.claim(lease_seconds=-1)["id"] == job_id
+    assert store.claim(lease_seconds=-1) is None
+
+    abandoned = store.abandon_expired(lease_seconds=-1)
+    assert [job["id"] for job in abandoned] == [job_id]
+    assert abandoned[0]["status"] == "failed"
+    assert "2 attempts" in abandoned[0]["error"]
+    assert store.claim(lease_seconds=-1) is None
+
+
+def test_jobs_endpoint_rejects_non_http_callback():
+    from app import app
+
+    response = app.test_client().post("/jobs", data={
+        "file": (io.BytesIO(b"%PDF-1.4"), "invoice.pdf"), "callback_url": "file:///etc/passwd",
+    })
+
+    assert response.status_code == 400
+    assert "callback_url" in response.get_json()["error"]
+
+
+def test_job_workers_start_on_any_request(monkeypatch):
+    import app as app_module
+
+    started = []
+    monkeypatch.setattr(app_module.job_workers, "start", lambda: started.append(True))
+
+    response = app_module.app.test_client().get("/metrics")
+
+    assert response.status_code == 200
+    assert started
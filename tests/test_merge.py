@@ -0,0 +1,91 @@
+import pytest
+
+from merge import merge_responses
+from postprocess import postprocess_invoice
+
+
+def item(description, quantity, price, amount):
+    return {"description": description, "quantity": quantity, "price": price, "amount": amount}
+
+
+A = item("Widget", "2", "10.00", "20.00")
+B = item("Gadget", "1", "5.00", "5.00")
+C = item("Bolt", "10", "1.00", "10.00")
+D = item("Nut", "10", "0.50", "5.00")
+
+
+def page(*items, **header):
+    return {"Seller Company Name": "ACME Kft.", **header, "Items": list(items)}
+
+
+def test_carried_over_block_at_top_of_continuation_page_is_dropped():
+    invoice = merge_responses([page(A, B, C), page(B, C, D)])
+
+    assert invoice["Items"] == [A, B, C, D]
+
+
+def test_item_repeated_later_on_another_page_is_kept():
+    invoice = merge_responses([page(A, B), page(C, A)])
+
+    assert invoice["Items"] == [A, B, C, A]
+
+
+def test_item_repeated_within_a_page_is_kept():
+    invoice = merge_responses([page(A, A), page(B)])
+
+    assert invoice["Items"] == [A, A, B]
+
+
+def test_failed_pages_are_listed():
+    invoice = merge_responses([page(A), {"error": "Failed to process page 2"}, page(B)])
+
+    assert invoice["Items"] == [A, B]
+    assert invoice["Failed pages"] == [2]
+    assert "Failed pages" not in merge_responses([page(A), page(B)])
+
+
+def test_all_pages_failed():
+    invoice = merge_responses([{"error": "Failed to process page 1"}, {"error": "Failed to process page 2"}])
+
+    assert invoice["Failed pages"] == [1, 2]
+    assert invoice["Items"] == "-"
+
+
+def test_failed_pages_invalidate_the_invoice():
+    invoice = postprocess_invoice(merge_responses([page(A), {"error": "Failed to process page 2"}]))
+
+    assert invoice["Validation"]["valid"] is False
+    assert {"check": "failed_pages", "pages": [2]} in invoice["Validation"]["issues"]
+
+
+def carried(description, amount):
+    return item(description, "-", "-", amount)
+
+
+@pytest.mark.parametrize("description", [
+    "Carried forward", "Brought forward:", "C/F", "Subtotal", "Sub-total page 1", "Page total",
+    "Átvitel 2. oldalról", "Áthozat:", "Részösszeg", "Oldal összesen", "Übertrag", "Zwischensumme",
+])
+def test_carried_over_rows_are_dropped(description):
+    invoice = merge_responses([page(A, B), page(carried(description, "99.00"), C)])
+
+    assert invoice["Items"] == [A, B, C]
+
+
+@pytest.mark.parametrize("row", [
+    item("c/o Kovács Kft. szállítás", "1", "12.00", "12.00"),
+    carried("c/o Kovács Kft.", "12.00"),
+    item("Subtotal adjustment fee", "1", "3.00", "3.00"),
+    carried("subtotal adjustment fee", "3.00"),
+    item("Carried forward", "2", "10.00", "20.00"),
+])
+def test_items_mentioning_a_carry_label_are_kept(row):
+    invoice = merge_responses([page(A, B), page(row, C)])
+
+    assert invoice["Items"] == [A, B, row, C]
+
+
+def test_unlabelled_row_matching_the_running_total_is_dropped():
+    invoice = merge_responses([page(A, B), page(carried("", "25.00"), C)])
+
+    assert invoice["Items"] == [A, B, C]
@@ -0,0 +1,58 @@
+import io
+
+import app
+from bench.corpus import synthetic_invoice
+
+
+def test_oversized_chunk_is_split_into_requests_under_the_byte_limit(monkeypatch):
+    content = synthetic_invoice(1, 4, True)
+    load, chunk = app.pdf_chunk_loaders(io.BytesIO(content), [0, 1, 2, 3])[0]
+    one_page = len(load([0]))
+    monkeypatch.setattr(app, "DOCUMENTAI_ONLINE_MAX_BYTES", int(one_page * 1.5))
+
+    parts = list(app.ocr_request_parts(load, chunk))
+
+    assert len(parts) > 1
+    assert [page_num for _, page_nums in parts for page_num in page_nums] == [0, 1, 2, 3]
+    assert all(len(pdf_content) <= app.DOCUMENTAI_ONLINE_MAX_BYTES for pdf_content, _ in parts)
+
+
+def test_small_chunk_is_sent_in_one_request():
+    content = synthetic_invoice(1, 3, True)
+    load, chunk = app.pdf_chunk_loaders(io.BytesIO(content), [0, 1, 2])[0]
+
+    assert [page_nums for _, page_nums in app.ocr_request_parts(load, chunk)] == [[0, 1, 2]]
+
+
+
+def test_scanned_invoice_with_oversized_chunks_keeps_every_page(monkeypatch):
+    content = synthetic_invoice(3, 4, True)
+    monkeypatch.setattr(app, "DOCUMENTAI_ONLINE_MAX_BYTES", 1)
+
+    events = list(app.iter_invoice_events(io.BytesIO(content)))
+
+    pages = sorted(data["page"] for event, data in events if event == "page")
+    assert pages == [1, 2, 3, 4]
+    assert "Failed pages" not in events[-1][1]
+
+
+def test_process_document_sample_returns_page_texts_in_order(tmp_path, monkeypatch):
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(synthetic_invoice(4, 12, True))
+    monkeypatch.setattr(app, "OCR_CHUNK_PAGES", 5)
+
+    texts = app.process_document_sample(app.PROJECT_ID, app.LOCATION, app.PROCESSOR_ID, str(path), app.MIME_TYPE)
+
+    assert len(texts) == 12
+    assert all(isinstance(text, str) and text.strip() for text in texts)
+
+
+def test_extract_invoice_data_per_page_merges_page_results():
+    document_pages = app.process_document_sample(
+        app.PROJECT_ID, app.LOCATION, app.PROCESSOR_ID, io.BytesIO(synthetic_invoice(5, 3, False)), app.MIME_TYPE
+    )
+
+    invoice = app.extract_invoice_data_per_page(document_pages)
+
+    assert isinstance(invoice["Items"], list) and invoice["Items"]
+    assert "Failed pages" not in invoice
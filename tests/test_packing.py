@@ -0,0 +1,51 @@
+import pytest
+
+import app
+from invoice_schema import INVOICE_FIELDS
+from merge import merge_responses
+
+HEADER = {**{field: "-" for field in INVOICE_FIELDS}, "PO Number": "PO-1", "Seller Company Name": "ACME Kft."}
+ITEM = {"description": "Widget", "quantity": "2", "unit": "db", "price": "10.00", "amount": "20.00"}
+
+
+def test_pages_are_packed_in_order_within_the_token_budget(monkeypatch):
+    monkeypatch.setattr(app, "LLM_PACK_MAX_PAGES", 3)
+    pages = ["x" * 40] * 7
+
+    assert app.pack_pages(range(7), pages) == [[0, 1, 2], [3, 4, 5], [6]]
+
+    budget = app.estimate_tokens(app.INVOICE_PROMPT + app.PACKED_PROMPT) + 2 * (app.estimate_tokens(pages[0]) + 8)
+    monkeypatch.setattr(app, "LLM_PACK_TOKEN_BUDGET", budget)
+    assert app.pack_pages(range(7), pages) == [[0, 1], [2, 3], [4, 5], [6]]
+
+
+def test_oversized_page_gets_its_own_group(monkeypatch):
+    monkeypatch.setattr(app, "LLM_PACK_TOKEN_BUDGET", app.estimate_tokens(app.INVOICE_PROMPT + app.PACKED_PROMPT) + 50)
+
+    assert app.pack_pages([0, 1, 2], ["short", "y" * 4000, "short"]) == [[0], [1], [2]]
+
+
+def test_split_puts_items_on_their_pages_and_the_header_on_the_first_page():
+    group_result = {**HEADER, "Items": [{**ITEM, "page": 5}, {**ITEM, "description": "Gadget", "page": 7}]}
+
+    pages = app.split_page_group_result(group_result, [4, 5, 6])
+
+    assert pages[4] == {**HEADER, "Items": [ITEM]}
+    assert pages[5] == {**dict.fromkeys(HEADER, "-"), "Items": "-"}
+    assert pages[6]["Items"] == [{**ITEM, "description": "Gadget"}]
+    assert all(value == "-" for field, value in pages[6].items() if field != "Items")
+
+
+def test_split_rejects_items_tagged_outside_the_group():
+    with pytest.raises(ValueError):
+        app.split_page_group_result({**HEADER, "Items": [{**ITEM, "page": 9}]}, [0, 1])
+
+
+def test_packed_header_votes_once_per_group():
+    group = app.split_page_group_result({**HEADER, "Items": []}, [0, 1, 2])
+    single_pages = [{**HEADER, "PO Number": "PO-2", "Items": "-"} for _ in range(2)]
+
+    invoice = merge_responses([group[0], group[1], group[2], *single_pages])
+
+    assert invoice["PO Number"] == "PO-2"
+    assert invoice["Seller Company Name"] == "ACME Kft."
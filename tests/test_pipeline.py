@@ -0,0 +1,98 @@
+import asyncio
+import io
+import threading
+
+import pytest
+from openai import AsyncOpenAI
+
+import app
+import asgi
+from bench.corpus import synthetic_invoice
+from cache import MemoryCache
+
+PAGE_A = "Terms and conditions\nPayment within 30 days."
+PAGE_B = "Invoice Number: INV-1\nWidget 2 x 10.00 = 20.00"
+PAGE_C = "Invoice Number: INV-1\nGadget 1 x 5.00 = 5.00"
+CACHED_RESULT = {"Invoice Number": "-", "Items": "-"}
+
+
+@pytest.fixture
+def fresh_async_clients(monkeypatch):
+    # Az aszinkron kliensek az első eseményhurokhoz kötődnek; tesztenként saját asyncio.run fut
+    monkeypatch.setattr(asgi, "async_client", AsyncOpenAI(api_key="test", max_retries=0))
+    monkeypatch.setattr(asgi, "_documentai_clients", {})
+
+
+@pytest.fixture
+def cached_page(monkeypatch):
+    cache = MemoryCache()
+    cache.set(app.page_cache_key(PAGE_A), CACHED_RESULT)
+    monkeypatch.setattr(app, "page_cache", cache)
+    return cache
+
+
+def test_packed_mode_emits_repeated_cached_pages(cached_page):
+    results = dict(app.iter_page_results([PAGE_A, PAGE_B, PAGE_A, PAGE_C], mode="packed"))
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[0] == CACHED_RESULT
+    assert results[2] == CACHED_RESULT
+    assert results[2] is not results[0]
+
+
+def test_async_packed_mode_emits_repeated_cached_pages(cached_page, fresh_async_clients):
+    document_pages = [PAGE_A, PAGE_B, PAGE_A, PAGE_C]
+
+    async def collect():
+        return {
+            page_num: page_result
+            async for page_num, page_result in asgi.iter_page_pipeline(
+                {}, list(enumerate(document_pages)), [], page_count=len(document_pages), mode="packed"
+            )
+        }
+
+    results = asyncio.run(collect())
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[2] == CACHED_RESULT
+
+
+def test_packed_mode_emits_repeated_template_pages(monkeypatch):
+    def template_page_data(page_num, page_text, page_count, stats=None):
+        return dict(CACHED_RESULT) if page_text == PAGE_A else None
+
+    monkeypatch.setattr(app, "template_page_data", template_page_data)
+    results = dict(app.iter_page_results([PAGE_A, PAGE_B, PAGE_A, PAGE_C], mode="packed"))
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[2] == CACHED_RESULT
+
+
+class ThreadRecordingCache(MemoryCache):
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value):
+        self.threads.add(threading.current_thread())
+        super().set(key, value)
+
+
+@pytest.mark.parametrize("mode", ["per_page", "packed"])
+def test_async_app_matches_flask_app_and_keeps_caches_off_the_event_loop(monkeypatch, fresh_async_clients, mode):
+    content = synthetic_invoice(2, 3, False)
+    expected = app.process_invoice_file(io.BytesIO(content), mode=mode)
+
+    recording = ThreadRecordingCache()
+    monkeypatch.setattr(app, "page_cache", recording)
+    monkeypatch.setattr(app, "result_cache", recording)
+    result = asyncio.run(asgi.process_invoice_file(io.BytesIO(content), mode=mode))
+
+    assert "Failed pages" not in expected
+    assert result == expected
+    assert recording.threads
+    assert threading.main_thread() not in recording.threads
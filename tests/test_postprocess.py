@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from postprocess import parse_dates, parse_numbers, postprocess_invoice
+
+
+def iso_dates(values):
+    return [None if pd.isna(value) else value.date().isoformat() for value in parse_dates(values)]
+
+
+@pytest.mark.parametrize("text", [
+    "2024. május 12.",
+    "2024. máj. 12.",
+    "2024 május 12",
+    "12. május 2024",
+    "2024.05.12.",
+    "2024-05-12",
+])
+def test_hungarian_and_numeric_dates(text):
+    assert iso_dates([text]) == ["2024-05-12"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("May 12, 2024", "2024-05-12"),
+    ("may 12 2024", "2024-05-12"),
+    ("Dec 5th, 2024", "2024-12-05"),
+    ("Sept. 3, 2023", "2023-09-03"),
+    ("12 May 2024", "2024-05-12"),
+    ("3 October 2023", "2023-10-03"),
+])
+def test_english_month_names(text, expected):
+    assert iso_dates([text]) == [expected]
+
+
+def test_ambiguous_numeric_dates_are_day_first():
+    assert iso_dates(["05/12/2024", "12.05.2024", "1/2/2024"]) == ["2024-12-05", "2024-05-12", "2024-02-01"]
+
+
+def test_month_first_numeric_date_is_unparsed():
+    assert iso_dates(["12/31/2024", "-", "no date"]) == [None, None, None]
+
+
+def test_month_first_english_date_is_not_flagged():
+    invoice = postprocess_invoice({"Invoice Date": "May 12, 2024", "Items": "-"})
+
+    assert invoice["Normalized"]["Invoice Date"] == "2024-05-12"
+    assert {"check": "unparsed_date"} not in invoice["Validation"]["issues"]
+
+
+def test_unparsable_date_is_flagged():
+    invoice = postprocess_invoice({"Invoice Date": "12/31/2024", "Items": "-"})
+
+    assert invoice["Normalized"]["Invoice Date"] is None
+    assert {"check": "unparsed_date"} in invoice["Validation"]["issues"]
+
+
+def test_number_formats():
+    values = parse_numbers(["1 234,50 Ft", "1.234,50", "1,234.50", "1.000", "12-", "-"]).tolist()
+
+    assert values[:5] == [1234.5, 1234.5, 1234.5, 1000.0, -12.0]
+    assert pd.isna(values[5])
@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from app import classify_openai_error
+from bench.fake_openai import FakeOpenAIServer
+from ratelimit import CircuitBreaker, CircuitOpenError, OutboundScheduler
+
+MESSAGES = [{"role": "user", "content": "Text of the invoice: test"}]
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer(latency=0.01, jitter=0.0, retry_after=0).start()
+    yield server
+    server.stop()
+
+
+def scheduler(breaker=None, max_retries=5):
+    return OutboundScheduler(
+        "OpenAI", classify_openai_error, max_retries=max_retries, base_delay=0.01, max_delay=0.05,
+        breaker=breaker or CircuitBreaker(failure_threshold=2, reset_timeout=0.2),
+    )
+
+
+def completion(server):
+    client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+    return lambda: client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+
+
+def run_concurrently(fn, count):
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(fn) for _ in range(count)]
+        return [future.result() for future in futures]
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_blip_is_retried_without_opening_the_breaker(server, status):
+    outbound = scheduler()
+    server.inject_errors([status] * 5)
+
+    results = run_concurrently(lambda: outbound.call(completion(server)), 4)
+
+    assert len(results) == 4
+    assert outbound.breaker.state == "closed"
+    assert server.stats()["injected_errors"] == 5
+
+
+def test_throttling_never_counts_toward_the_breaker(server):
+    outbound = scheduler(max_retries=2)
+    server.inject_errors([429] * 20)
+
+    for _ in range(3):
+        with pytest.raises(Exception):
+            outbound.call(completion(server))
+    assert outbound.breaker.state == "closed"
+
+
+def test_open_breaker_is_waited_for_within_the_retry_budget(server):
+    outbound = scheduler(max_retries=2)
+    # Két hívás minden újrapróbálás után is 503-at kap: a megszakító kinyit
+    server.inject_errors([503] * 6)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            outbound.call(completion(server))
+    assert outbound.breaker.state == "open"
+
+    # A következő hívás kivárja a half-open állapotot (5 x 0.05 s > 0.2 s), a próbahívás sikeres
+    outbound.max_retries = 5
+    assert outbound.call(completion(server)).choices
+    assert outbound.breaker.state == "closed"
+
+
+def test_open_breaker_fails_once_the_budget_is_spent(server):
+    outbound = scheduler(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60), max_retries=1)
+    server.inject_errors([503] * 2)
+    with pytest.raises(Exception):
+        outbound.call(completion(server))
+
+    with pytest.raises(CircuitOpenError):
+        outbound.call(completion(server))
+
+
+def test_async_blip_is_retried(server):
+    outbound = scheduler()
+    client = AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+    server.inject_errors([429, 503] * 3)
+
+    async def main():
+        return await asyncio.gather(*(
+            outbound.acall(lambda: client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES))
+            for _ in range(4)
+        ))
+
+    assert len(asyncio.run(main())) == 4
+    assert outbound.breaker.state == "closed"
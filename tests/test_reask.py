@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import types
+
+import pytest
+
+import app
+from invoice_schema import INVOICE_FIELDS
+
+HEADER = {field: "-" for field in INVOICE_FIELDS}
+ITEM = {"description": "Widget", "quantity": "2", "unit": "db", "price": "10.00", "amount": "20.00"}
+
+
+class FakeCompletion:
+    """Sorban visszaadja a megadott válaszokat, és rögzíti a kéréseket."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, content, stats=None, schema=None):
+        self.calls.append((content, schema))
+        return json.dumps(self.responses.pop(0))
+
+
+@pytest.fixture
+def structured_output(monkeypatch):
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT", True)
+
+
+def test_malformed_field_is_reasked_with_a_subset_schema(monkeypatch, structured_output):
+    fake = FakeCompletion({**HEADER, "Invoice Date": 20240512, "Items": "see below"}, {"Items": [ITEM]})
+    monkeypatch.setattr(app, "request_invoice_completion", fake)
+
+    result = app.extract_page_data(0, "Widget 2 db 10.00 20.00", 1)
+
+    assert result["Items"] == [ITEM]
+    assert result["Invoice Date"] == "20240512"
+    content, schema = fake.calls[1]
+    assert "- Items\n" in content and "Invoice Date" not in content
+    assert list(schema["properties"]) == ["Items"]
+
+
+def test_field_malformed_twice_becomes_missing(monkeypatch, structured_output):
+    fake = FakeCompletion({**HEADER, "Items": "see below"}, {"Items": "still not a list"})
+    monkeypatch.setattr(app, "request_invoice_completion", fake)
+
+    result = app.extract_page_data(0, "text", 1)
+
+    assert result["Items"] == []
+    assert len(fake.calls) == 2
+
+
+def test_packed_reask_keeps_the_page_tagging_instruction(monkeypatch, structured_output):
+    fake = FakeCompletion({**HEADER, "Items": "see below"}, {"Items": [{**ITEM, "page": 2}]})
+    monkeypatch.setattr(app, "request_invoice_completion", fake)
+
+    results = app.run_completion_steps(app.page_group_steps([0, 1], ["page one", "page two"], 2))
+
+    assert results[0]["Items"] == "-"
+    assert results[1]["Items"] == [ITEM]
+    content, schema = fake.calls[1]
+    assert app.PACKED_PROMPT in content
+    assert "page" in schema["properties"]["Items"]["items"]["required"]
+
+
+@pytest.mark.parametrize("module_name", ["app2", "app3"])
+def test_s_apps_reask_malformed_fields(monkeypatch, module_name):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "s"))
+    try:
+        module = __import__(module_name)
+    finally:
+        sys.path.pop(0)
+    responses = [{**HEADER, "Items": "see below"}, {"Items": [ITEM]}]
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        message = types.SimpleNamespace(content=json.dumps(responses.pop(0)))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(module.client.chat.completions, "create", create)
+    invoice_data = module.extract_invoice_data("Widget 2 db 10.00 20.00")
+
+    assert invoice_data["Items"] == [ITEM]
+    assert list(calls[1]["response_format"]["json_schema"]["schema"]["properties"]) == ["Items"]
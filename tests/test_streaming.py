@@ -0,0 +1,50 @@
+import json
+import threading
+import urllib.request
+
+import pytest
+from werkzeug.serving import make_server
+
+from app import app
+from bench.corpus import synthetic_invoice
+from bench.run import encode_multipart
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def post_stream(url, content, headers=None):
+    body, content_type = encode_multipart("file", "invoice.pdf", content)
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type, **(headers or {})})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return resp.headers.get("Content-Type"), resp.read().decode("utf-8")
+
+
+@pytest.mark.parametrize("scanned", [False, True])
+def test_ndjson_stream_of_real_upload(server_url, scanned):
+    content_type, text = post_stream(f"{server_url}/upload_pdf?stream=ndjson", synthetic_invoice(1, 3, scanned))
+
+    assert content_type.startswith("application/x-ndjson")
+    events = [json.loads(line) for line in text.splitlines()]
+    names = [event["event"] for event in events]
+    assert "error" not in names
+    assert names[0] == "started"
+    assert names.count("page") == 3
+    assert names[-2:] == ["stats", "result"]
+    assert isinstance(events[-1]["data"]["Items"], list)
+
+
+def test_sse_stream_selected_by_accept_header(server_url):
+    content_type, text = post_stream(
+        f"{server_url}/upload_pdf", synthetic_invoice(2, 2), {"Accept": "text/event-stream"}
+    )
+
+    assert content_type.startswith("text/event-stream")
+    names = [line[len("event: "):] for line in text.splitlines() if line.startswith("event: ")]
+    assert names == ["started", "pages", "page", "page", "stats", "result"]
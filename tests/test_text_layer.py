@@ -0,0 +1,49 @@
+import pytest
+
+import app
+
+TERMS = (
+    "Általános szerződési feltételek. A szállító a megrendelt terméket a megrendelő által megadott "
+    "címre szállítja. A vételár megfizetéséig a termék a szállító tulajdonában marad. Reklamációt a "
+    "kézhezvételt követő nyolc napon belül írásban lehet benyújtani. A felek vitás kérdéseiket "
+    "elsősorban tárgyalás útján rendezik, ennek sikertelensége esetén a szállító székhelye szerinti "
+    "bíróság illetékes. Jelen feltételek a számla elválaszthatatlan részét képezik."
+)
+COVER = "Számla melléklet - ACME Kereskedelmi Kft. - Szállítólevelek"
+INVOICE = "Számla száma: INV-2024-0012 Kelt: 2024.05.12. Widget 2 db 10,00 20,00 Fizetendő: 25,40 Ft"
+
+
+def garbled(text, ratio):
+    """A látható karakterek adott hányadát �-re cseréli."""
+    visible = [index for index, ch in enumerate(text) if not ch.isspace()]
+    chars = list(text)
+    for index in visible[:int(len(visible) * ratio)]:
+        chars[index] = "�"
+    return "".join(chars)
+
+
+@pytest.mark.parametrize("text", [TERMS, COVER, INVOICE])
+def test_clean_text_layer_passes_without_digits_or_currency(text):
+    assert app.text_layer_quality(text) >= app.TEXT_LAYER_MIN_SCORE
+
+
+def test_too_short_or_empty_text_layer_scores_zero():
+    assert app.text_layer_quality("") == 0.0
+    assert app.text_layer_quality("Oldal 2 / 3") == 0.0
+
+
+@pytest.mark.parametrize("text", [TERMS, INVOICE])
+def test_mostly_garbled_text_layer_fails(text):
+    assert app.text_layer_quality(garbled(text, 0.3)) < app.TEXT_LAYER_MIN_SCORE
+
+
+def test_digits_and_currency_break_ties_for_partly_garbled_text():
+    invoice = garbled(INVOICE * 5, 0.08)
+    terms = garbled(TERMS, 0.08)
+
+    assert app.text_layer_quality(invoice) >= app.TEXT_LAYER_MIN_SCORE > app.text_layer_quality(terms)
+
+
+def test_score_grows_with_printable_ratio_and_length():
+    assert app.text_layer_quality(garbled(TERMS, 0.05)) < app.text_layer_quality(TERMS)
+    assert app.text_layer_quality(TERMS[:80]) < app.text_layer_quality(TERMS)
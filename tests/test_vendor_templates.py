@@ -0,0 +1,38 @@
+from vendor_templates import apply_template, build_template
+
+PAGE = """ACME Kft.
+Seller Tax No.: 12345678-2-42
+Tel: +36 1 234 5678
+Invoice Date: 2024-01-15
+Widget 2 10.00 20.00
+Total: 25.40
+Page 1 of 1"""
+
+RESULT = {
+    "Seller Company Name": "ACME Kft.",
+    "Seller Tax No.": "12345678-2-42",
+    "Invoice Date": "2024-01-15",
+    "Total included VAT": "25.40",
+    "Items": [{"description": "Widget", "quantity": "2", "price": "10.00", "amount": "20.00"}],
+}
+
+
+def test_template_covers_the_learned_layout():
+    template = build_template(PAGE, RESULT)
+    page = PAGE.replace("2024-01-15", "2024-02-20").replace("Page 1 of 1", "Page 1 of 2")
+
+    page_result, confidence = apply_template(template, page)
+
+    assert confidence == 1.0
+    assert page_result["Invoice Date"] == "2024-02-20"
+    assert page_result["Items"][0]["description"] == "Widget"
+
+
+def test_unknown_labelled_line_lowers_confidence():
+    template = build_template(PAGE, RESULT)
+    page = PAGE.replace("Total: 25.40", "PO Number: PO-77\nTotal: 25.40")
+
+    page_result, confidence = apply_template(template, page)
+
+    assert page_result["PO Number"] == "-"
+    assert confidence < 1.0
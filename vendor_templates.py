@@ -0,0 +1,345 @@
+"""Szállítónkénti számlasablonok: visszatérő szállítók számlái LLM hívás nélkül.
+
+A sablon kulcsa az eladó adószáma. A sablon a korábbi, ellenőrzött (LLM által
+kinyert) oldalakból tanult sormintákból áll: a mezők értékei helyén csoport
+áll, a címkék és elválasztók szó szerint szerepelnek. Egy sablont csak akkor
+használunk, ha már min_verified alkalommal pontosan ugyanazt adta, mint az
+LLM, és az adott oldal minden fejlécsorát és minden számot vagy címkét
+tartalmazó sorát lefedi (a tanult oldal állandó szövegén kívül, így pl. egy új
+"PO Number: ..." sor miatt az LLM dolgozik). Az audit_rate arányban a
+megbízható sablon ellenére is az LLM dolgozik, eltérés esetén a sablon
+elveszti a megbízhatóságát.
+"""
+import re
+import json
+import time
+import random
+import sqlite3
+import threading
+from functools import lru_cache
+
+from cache import CacheStats
+from invoice_schema import INVOICE_FIELDS, ITEM_FIELDS
+
+TAX_NUMBER_PATTERN = re.compile(r"\b(?:[A-Z]{2})?\d{8}(?:-\d-\d{2})?\b")
+# Mezőértéket hordozhat: számot vagy "Címke:" alakú címkét tartalmaz
+FIELD_LINE_PATTERN = re.compile(r"\d|[^\W\d_]\s*:")
+
+# Az eladó adatai szállítónként állandók; a számok és a kötött formátumú mezők
+# alakja tanulható; a többi szabad szöveg
+CONSTANT_FIELDS = {"Seller Company Name", "Seller Company Address", "Seller Tax No."}
+NUMBER_FIELDS = {
+    "VAT percent", "Subtotal excluded VAT", "Total included VAT", "Shipping Cost", "quantity", "price", "amount",
+}
+SHAPE_FIELDS = {"Invoice Date", "PO Number", "Buyer Tax No."}
+
+NUMBER_VALUE = r"-?\d(?:[\d .,]*\d)?"
+TEXT_VALUE = r".+?"
+SHAPE_TOKEN = re.compile(r"\d+|[^\W\d_]+|\s+|.")
+
+
+def normalize_tax_number(value):
+    return re.sub(r"[^0-9A-Z]", "", value.upper())
+
+
+def normalize_space(text):
+    return " ".join(str(text).split())
+
+
+def page_lines(page_text):
+    """Az oldal nem üres sorai whitespace-normalizálva."""
+    return [line for line in (normalize_space(line) for line in page_text.splitlines()) if line]
+
+
+def shape_pattern(value):
+    """Az érték alakja: számjegy-, betű- és szóközfuttatások, a többi karakter szó szerint."""
+    parts = []
+    for token in SHAPE_TOKEN.findall(value):
+        if token[0].isdigit():
+            parts.append(r"\d+")
+        elif token[0].isspace():
+            parts.append(r"\s+")
+        elif token[0].isalpha():
+            parts.append(r"[^\W\d_]+")
+        else:
+            parts.append(re.escape(token))
+    return "".join(parts)
+
+
+def value_pattern(field, value):
+    if field in CONSTANT_FIELDS:
+        return re.escape(value)
+    if field in NUMBER_FIELDS:
+        # A szám tetszőleges hosszú lehet, csak az előtte/utána álló pénznem vagy jel alakja kötött
+        match = re.search(NUMBER_VALUE, value)
+        if match is not None:
+            return shape_pattern(value[:match.start()]) + NUMBER_VALUE + shape_pattern(value[match.end():])
+    if field in NUMBER_FIELDS or field in SHAPE_FIELDS:
+        return shape_pattern(value)
+    return TEXT_VALUE
+
+
+def find_value(line, value, taken):
+    """Az érték első előfordulása a sorban, amely nem fed át a már lefoglalt szakaszokkal."""
+    for match in re.finditer(r"(?<![\w.,])" + re.escape(value) + r"(?!\w)", line):
+        start, end = match.span()
+        if all(end <= taken_start or start >= taken_end for taken_start, taken_end in taken):
+            return start, end
+    return None
+
+
+def line_pattern(line, values):
+    """Sorminta a (mező, érték) párokból; None, ha valamelyik érték nem található a sorban.
+
+    A hosszabb értékeket keressük először, hogy egy rövid szám (pl. mennyiség)
+    ne egy hosszabb érték (pl. leírás) belsejében találjon egyezést.
+    """
+    spans = []
+    for field, value in sorted(values, key=lambda pair: -len(pair[1])):
+        span = find_value(line, value, [(start, end) for start, end, _, _ in spans])
+        if span is None:
+            return None
+        spans.append((*span, field, value))
+    spans.sort()
+
+    parts = []
+    fields = []
+    position = 0
+    for start, end, field, value in spans:
+        parts.append(re.escape(line[position:start]))
+        parts.append(f"(?P<g{len(fields)}>{value_pattern(field, value)})")
+        fields.append(field)
+        position = end
+    parts.append(re.escape(line[position:]))
+    return {"pattern": "".join(parts), "fields": fields}
+
+
+def static_line_pattern(line):
+    """Kinyert értéket nem tartalmazó sor mintája; a számok (oldalszám, dátum) tetszőlegesek lehetnek."""
+    return r"\d+".join(re.escape(part) for part in re.split(r"\d+", line))
+
+
+@lru_cache(maxsize=4096)
+def compiled(pattern):
+    return re.compile(pattern)
+
+
+def match_line(line_template, line):
+    match = compiled(line_template["pattern"]).fullmatch(line)
+    if match is None:
+        return None
+    return {field: match.group(f"g{index}") for index, field in enumerate(line_template["fields"])}
+
+
+def present(value):
+    return isinstance(value, str) and normalize_space(value) not in ("", "-")
+
+
+def build_template(page_text, page_result):
+    """Sablon tanulása egy ellenőrzött oldaleredményből; None, ha nem minden érték található meg a szövegben."""
+    lines = page_lines(page_text)
+
+    # Fejlécmezők: soronként csoportosítva, ahol először előfordulnak
+    fields_by_line = {}
+    for field in INVOICE_FIELDS:
+        value = page_result.get(field)
+        if not present(value):
+            continue
+        value = normalize_space(value)
+        line_index = next((index for index, line in enumerate(lines) if find_value(line, value, [])), None)
+        if line_index is None:
+            return None
+        fields_by_line.setdefault(line_index, []).append((field, value))
+
+    header = []
+    for line_index, values in sorted(fields_by_line.items()):
+        line_template = line_pattern(lines[line_index], values)
+        if line_template is None:
+            return None
+        # A csak összegeket tartalmazó sorok (végösszeg, ÁFA) nem minden oldalon szerepelnek
+        line_template["optional"] = all(field in NUMBER_FIELDS for field in line_template["fields"])
+        header.append(line_template)
+
+    header_lines = set(fields_by_line)
+    item_lines = set()
+    item_patterns = {}
+    items = page_result.get("Items")
+    for item in items if isinstance(items, list) else []:
+        values = [(field, normalize_space(item[field])) for field in ITEM_FIELDS if present(item.get(field))]
+        line_index, line_template = next(
+            (
+                (index, template) for index, template in (
+                    (index, line_pattern(line, values))
+                    for index, line in enumerate(lines) if index not in header_lines
+                )
+                if template is not None
+            ),
+            (None, None),
+        )
+        if line_template is None:
+            return None
+        item_lines.add(line_index)
+        item_patterns.setdefault(line_template["pattern"], line_template)
+
+    # A többi számot vagy címkét tartalmazó sor (pl. elérhetőség, oldalszám) a szállító állandó szövege
+    static = {
+        static_line_pattern(line) for index, line in enumerate(lines)
+        if index not in header_lines and index not in item_lines and FIELD_LINE_PATTERN.search(line)
+    }
+    return {"header": header, "items": list(item_patterns.values()), "static": sorted(static)}
+
+
+def apply_template(template, page_text):
+    """A sablon alkalmazása egy oldalra; (oldaleredmény, megbízhatóság 0 és 1 között).
+
+    A megbízhatóság a lefedett kötelező fejlécsorok és tételsorok aránya az
+    összes kötelező fejlécsorhoz és mezőértéket hordozható sorhoz képest. A
+    sablon állandó szövegén kívüli, számot vagy címkét tartalmazó sorok (pl. egy
+    új "PO Number: ..." sor) ki nem nyert értéket jelezhetnek, ezért rontják a
+    megbízhatóságot.
+    """
+    lines = page_lines(page_text)
+    page_result = {field: "-" for field in INVOICE_FIELDS}
+    used = set()
+    expected = 0
+    found = 0
+    for line_template in template["header"]:
+        if not line_template["optional"]:
+            expected += 1
+        for index, line in enumerate(lines):
+            if index in used:
+                continue
+            values = match_line(line_template, line)
+            if values is not None:
+                page_result.update(values)
+                used.add(index)
+                if not line_template["optional"]:
+                    found += 1
+                break
+
+    # A szállító állandó szövege (elérhetőség, oldalszám) nem tétel, és nem hordoz ki nem nyert értéket
+    static = [compiled(pattern) for pattern in template.get("static", [])]
+    used.update(
+        index for index, line in enumerate(lines)
+        if index not in used and any(pattern.fullmatch(line) for pattern in static)
+    )
+
+    items = []
+    for index, line in enumerate(lines):
+        if index in used:
+            continue
+        for line_template in template["items"]:
+            values = match_line(line_template, line)
+            if values is not None:
+                items.append({field: values.get(field, "-") for field in ITEM_FIELDS})
+                used.add(index)
+                break
+    page_result["Items"] = items
+
+    unmatched = sum(1 for index, line in enumerate(lines) if index not in used and FIELD_LINE_PATTERN.search(line))
+    total = expected + len(items) + unmatched
+    return page_result, (found + len(items)) / total if total else 0.0
+
+
+def same_result(template_result, page_result):
+    """A sablon és az LLM eredményének összevetése (whitespace-normalizálva)."""
+    for field in INVOICE_FIELDS:
+        expected = page_result.get(field)
+        expected = normalize_space(expected) if present(expected) else "-"
+        if normalize_space(template_result[field]) != expected:
+            return False
+
+    def item_rows(items):
+        return [
+            tuple(normalize_space(item.get(field, "-")) if present(item.get(field)) else "-" for field in ITEM_FIELDS)
+            for item in (items if isinstance(items, list) else [])
+        ]
+
+    return item_rows(template_result["Items"]) == item_rows(page_result.get("Items"))
+
+
+class VendorTemplateStore:
+    """Szállítói sablonok SQLite adatbázisban; több folyamat is használhatja ugyanazt a fájlt."""
+
+    def __init__(self, path, min_verified=2, min_confidence=1.0, audit_rate=0.02):
+        self.path = path
+        self.min_verified = min_verified
+        self.min_confidence = min_confidence
+        self.audit_rate = audit_rate
+        self.stats = CacheStats()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vendor_templates "
+                "(seller_tax_no TEXT PRIMARY KEY, template TEXT NOT NULL, verified INTEGER NOT NULL, "
+                "hits INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, seller_tax_no):
+        """(sablon, ellenőrzések száma) vagy None."""
+        row = self._connect().execute(
+            "SELECT template, verified FROM vendor_templates WHERE seller_tax_no = ?", (seller_tax_no,)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def put(self, seller_tax_no, template, verified):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO vendor_templates (seller_tax_no, template, verified, hits, updated_at) "
+                "VALUES (?, ?, ?, COALESCE((SELECT hits FROM vendor_templates WHERE seller_tax_no = ?), 0), ?)",
+                (seller_tax_no, json.dumps(template), verified, seller_tax_no, time.time()),
+            )
+
+    def extract(self, page_text):
+        """Oldal kinyerése megbízható sablonnal; None, ha nincs ilyen sablon vagy a megbízhatóság alacsony."""
+        for seller_tax_no in dict.fromkeys(
+            normalize_tax_number(value) for value in TAX_NUMBER_PATTERN.findall(page_text)
+        ):
+            entry = self.get(seller_tax_no)
+            if entry is None or entry[1] < self.min_verified:
+                continue
+            page_result, confidence = apply_template(entry[0], page_text)
+            if confidence < self.min_confidence:
+                continue
+            if random.random() < self.audit_rate:
+                # Szúrópróba: az LLM eredménye a learn() hívásban ellenőrzi a sablont
+                break
+            self.stats.record(True)
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE vendor_templates SET hits = hits + 1 WHERE seller_tax_no = ?", (seller_tax_no,)
+                )
+            return page_result
+        self.stats.record(False)
+        return None
+
+    def learn(self, page_text, page_result):
+        """Az LLM által kinyert oldal alapján a sablon ellenőrzése vagy (újra)tanulása."""
+        seller_tax_no = page_result.get("Seller Tax No.")
+        if not present(seller_tax_no) or "error" in page_result:
+            return
+        seller_tax_no = normalize_tax_number(seller_tax_no)
+
+        entry = self.get(seller_tax_no)
+        if entry is not None:
+            template, verified = entry
+            template_result, confidence = apply_template(template, page_text)
+            if confidence >= self.min_confidence and same_result(template_result, page_result):
+                self.put(seller_tax_no, template, verified + 1)
+                return
+            if confidence < self.min_confidence and verified >= self.min_verified:
+                # Ez az oldal (pl. folytatólagos oldal) nem olyan, amit a megbízható sablon lefed
+                return
+            print(f"Vendor template for {seller_tax_no} disagreed with the LLM, relearning")
+
+        template = build_template(page_text, page_result)
+        if template is not None:
+            self.put(seller_tax_no, template, 0)